@@ -41,7 +41,7 @@ from .database import (
     check_password,
     add_device,
     get_device_by_device_id,        
-    get_device_by_device_id_any,               
+    get_device_by_device_id_cached,
     get_all_devices,
     get_all_devices_any,
     set_email_consent,
@@ -344,6 +344,26 @@ def api_latest_images_for_user():
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET")
 INFLUX_MEASUREMENT = os.getenv("INFLUX_MEASUREMENT", "sensor_readings")
 
+# 최신값 Influx 폴백 쿼리: bucket/measurement는 로드 시 1번 채우고 요청마다 device_id만 format
+# (device_id는 get_device_by_device_id()로 DB에 있는 값임을 확인한 뒤에만 넣음)
+_FLUX_LATEST_TEMPLATE = f'''
+        from(bucket: "{INFLUXDB_BUCKET}")
+          |> range(start: -7d)
+          |> filter(fn: (r) => r._measurement == "{INFLUX_MEASUREMENT}")
+          |> filter(fn: (r) => r.device_id == "{{device_id}}")
+          |> pivot(rowKey:["_time"], columnKey:["_field"], valueColumn:"_value")
+          |> keep(columns: ["_time","device_id",
+                            "temperature","Temperature",
+                            "humidity","Humidity",
+                            "light_lux","lightLux","light","Light","Lux",
+                            "soil_moisture","soilMoisture",
+                            "soil_ec","soilEC",
+                            "soil_temp","soilTemp",
+                            "battery","Battery"])
+          |> sort(columns: ["_time"], desc: true)
+          |> limit(n: 1)
+        '''
+
 DEVICE_PREFIX = os.getenv("DEVICE_PREFIX", "ge-sd")
 
 def normalize_device_id(raw: str) -> str:
@@ -404,7 +424,7 @@ def get_latest_ai_from_redis(device_id: str):
 
 # DB에서 friendly_name 조회
 def get_friendly_name(device_id: str) -> str:
-    dev = get_device_by_device_id_any(device_id)
+    dev = get_device_by_device_id_cached(device_id)
     return (dev and dev.get("friendly_name")) or device_id
 
 
@@ -419,7 +439,7 @@ def send_realtime_data_to_clients(device_id: str):
     try:
         data = get_redis_data(f"latest_sensor_data:{device_id}") or {}
         # ★ plant_type을 DB에서 읽어 상태까지 포함해 내려준다
-        dev = get_device_by_device_id_any(device_id)
+        dev = get_device_by_device_id_cached(device_id)
         plant_type = (dev and dev.get("plant_type")) or None
         values = classify_payload(plant_type, data)  # {"temperature": {"value":..,"status":..,"range":[..]}, ...}
         payload = {
@@ -540,24 +560,7 @@ def api_latest_sensor_data(device_id):
         keys = ["temperature","humidity","light_lux","soil_moisture","soil_ec","soil_temp","battery"]
         return all(d.get(k) in (None, "", []) for k in keys)
     if not data or _is_empty_payload(data):
-        flux = f'''
-        from(bucket: "{INFLUXDB_BUCKET}")
-          |> range(start: -7d)
-          |> filter(fn: (r) => r._measurement == "{INFLUX_MEASUREMENT}")
-          |> filter(fn: (r) => r.device_id == "{device_id}")
-          |> pivot(rowKey:["_time"], columnKey:["_field"], valueColumn:"_value")
-          |> keep(columns: ["_time","device_id",
-                            "temperature","Temperature",
-                            "humidity","Humidity",
-                            "light_lux","lightLux","light","Light","Lux",
-                            "soil_moisture","soilMoisture",
-                            "soil_ec","soilEC",
-                            "soil_temp","soilTemp",
-                            "battery","Battery"])
-          |> sort(columns: ["_time"], desc: true)
-          |> limit(n: 1)
-        '''
-        rows = query_influxdb_data(flux) or []
+        rows = query_influxdb_data(_FLUX_LATEST_TEMPLATE.format(device_id=device_id)) or []
         if rows:
             r = rows[0]
             # 필드 alias 대응 + 숫자형 변환
@@ -715,8 +718,8 @@ def get_historical_sensor_data(device_id: str):
             val = r.get("_value")
             if fld:
                 d[fld] = (float(val) if isinstance(val, str) and val.replace('.','',1).isdigit() else val)
-        data = list(by_time.values())
-        data.sort(key=lambda x: x.get("time"))
+        # 시간 키만 1번 정렬해서 꺼냄 (행마다 lambda로 키를 꺼내 정렬하지 않음)
+        data = [by_time[t] for t in sorted(by_time)]
 
     # friendly_name 부여
     for row in data:
@@ -1,5 +1,6 @@
 import time, sqlite3
 import os
+import threading
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from pathlib import Path
@@ -9,6 +10,8 @@ import re
 BASE_DIR = Path(__file__).resolve().parents[1]
 DATABASE_FILE = BASE_DIR / "data" / "greeneye_users.db"
 DB_PATH = str(DATABASE_FILE)  # ← join 하지 말고 str()로!
+DB_REUSE_CONN = os.getenv("DB_REUSE_CONN", "1") == "1"  # 스레드별 연결 재사용 (0이면 매번 새로 연결)
+DEVICE_CACHE_TTL_SEC = float(os.getenv("DEVICE_CACHE_TTL_SEC", "300"))  # 디바이스 조회 캐시 유지 시간 (0이면 캐시 안 함)
 
 def _normalize_mac(mac: str) -> str:
     """
@@ -36,7 +39,53 @@ def _derive_device_id_from_mac(mac: str) -> str:
     base = hex_only if hex_only else tail
     return base[-4:].lower()
 
+_db_local = threading.local()  # 스레드별 유휴 연결 1개: (pid, sqlite3.Connection)
+
+class _PooledConnection:
+    """get_db_connection()이 돌려주는 sqlite3 연결 래퍼 (나머지 속성/메서드는 원래 연결로 위임).
+    close() 또는 with 블록 종료 시 실제로 닫지 않고, 커밋 안 된 변경을 롤백한 뒤
+    현재 스레드의 유휴 연결로 반납 → 같은 스레드의 다음 조회는 connect/PRAGMA 없이 바로 사용."""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.__exit__(exc_type, exc, tb)  # sqlite3와 동일: 정상 종료면 commit, 예외면 rollback
+        self.close()
+        return False
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            conn.rollback()  # 실제 close()처럼 미커밋 변경은 버림
+        except sqlite3.Error:
+            conn.close()
+            return
+        if getattr(_db_local, "idle", None) is None:
+            _db_local.idle = (os.getpid(), conn)
+        else:
+            conn.close()
+
 def get_db_connection():
+    """sqlite 연결. DB_REUSE_CONN이면 현재 스레드의 유휴 연결을 꺼내 쓰고(없으면 새로 연결),
+    close()/with 종료 시 반납된다. 사용 중인 연결은 유휴 슬롯에서 빠지므로 중첩 호출은 별도 연결을 받는다."""
+    if not DB_REUSE_CONN:
+        return _open_db_connection()
+    idle = getattr(_db_local, "idle", None)
+    _db_local.idle = None
+    # fork로 물려받은 연결은 쓰지 않음 (프로세스 간 sqlite 연결 공유 금지)
+    if idle is not None and idle[0] == os.getpid():
+        return _PooledConnection(idle[1])
+    return _PooledConnection(_open_db_connection())
+
+def _open_db_connection():
      db_path = str(DATABASE_FILE)
      os.makedirs(DATABASE_FILE.parent, exist_ok=True)
      conn = sqlite3.connect(
@@ -165,6 +214,7 @@ def init_db():
     except Exception:
         pass
     conn.close()
+    _invalidate_device_cache()  # 마이그레이션으로 device_id/mac_address가 바뀌었을 수 있음
     
 def set_email_consent(user_id: int, consent: bool) -> None:
     """사용자의 이메일 발송 동의 여부 저장"""
@@ -271,6 +321,7 @@ def add_device(
                 (device_id, norm_mac, friendly_name, owner_user_id, plant_type, room),
             )
         conn.commit()
+        _invalidate_device_cache(device_id)  # 미등록(None)으로 캐시돼 있었을 수 있음
         return True
     except sqlite3.IntegrityError:
         return False
@@ -298,7 +349,7 @@ def get_device_by_device_id(device_id: str, owner_user_id: int) -> Optional[dict
 def get_all_devices_any():
     with get_db_connection() as conn:
         rows = conn.execute(
-            "SELECT device_id, friendly_name, device_image, plant_type, room FROM devices ORDER BY device_id"
+            "SELECT device_id, friendly_name, device_image, plant_type, room, owner_user_id FROM devices ORDER BY device_id"
         ).fetchall()
         return [dict(r) for r in rows]
 
@@ -310,6 +361,37 @@ def get_device_by_device_id_any(device_id: str):
         ).fetchone()
         return dict(row) if row else None
 
+_device_cache = {}  # device_id -> (조회 시각 monotonic, 디바이스 dict 또는 None)
+_device_cache_gen = 0  # 무효화될 때마다 증가 (무효화 전에 읽은 값을 다시 캐시하지 않도록)
+_DEVICE_CACHE_MAX = 1024
+
+def get_device_by_device_id_cached(device_id: str):
+    """get_device_by_device_id_any의 TTL 캐시 버전 (MQTT 메시지마다 SQLite 조회하지 않도록).
+    미등록(None)도 캐시하며, 이 모듈의 등록/삭제/수정 함수가 해당 항목을 무효화한다.
+    (반환된 dict는 공유 객체이므로 수정하지 말 것)"""
+    if DEVICE_CACHE_TTL_SEC <= 0:
+        return get_device_by_device_id_any(device_id)
+    now = time.monotonic()
+    hit = _device_cache.get(device_id)
+    if hit is not None and now - hit[0] < DEVICE_CACHE_TTL_SEC:
+        return hit[1]
+    gen = _device_cache_gen
+    dev = get_device_by_device_id_any(device_id)
+    if gen == _device_cache_gen:
+        if len(_device_cache) >= _DEVICE_CACHE_MAX:
+            _device_cache.clear()  # 토픽으로 임의 ID가 들어와도 무한정 커지지 않게
+        _device_cache[device_id] = (now, dev)
+    return dev
+
+def _invalidate_device_cache(device_id: str = None):
+    """디바이스 행이 바뀐 뒤 호출 (device_id 없으면 전체 비움)"""
+    global _device_cache_gen
+    _device_cache_gen += 1
+    if device_id is None:
+        _device_cache.clear()
+    else:
+        _device_cache.pop(device_id, None)
+
 def get_device_by_friendly_name(friendly_name):
     conn = get_db_connection()
     cur = conn.cursor()
@@ -343,7 +425,9 @@ def delete_device_from_db(device_id: str, owner_user_id: int | None = None) -> b
                 "DELETE FROM devices WHERE device_id = ?",
                 (device_id,),
             )
-        return cur.rowcount > 0
+        deleted = cur.rowcount > 0
+    _invalidate_device_cache(device_id)  # 커밋(with 종료) 후 무효화
+    return deleted
 
 def update_device_image(device_id: str, owner_user_id: int, device_image: Optional[str]) -> bool:
     """
@@ -354,7 +438,9 @@ def update_device_image(device_id: str, owner_user_id: int, device_image: Option
             "UPDATE devices SET device_image = ? WHERE device_id = ? AND owner_user_id = ?",
             (device_image, device_id, owner_user_id),
         )
-        return cur.rowcount > 0
+        updated = cur.rowcount > 0
+    _invalidate_device_cache(device_id)
+    return updated
 
 if __name__ == '__main__':
     init_db()
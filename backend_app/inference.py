@@ -2,14 +2,21 @@
 
 import torch
 import torchvision.transforms as transforms
-from torch.utils.data import DataLoader
+import torchvision.transforms.functional as TF
 from PIL import Image
 import io
 import os
 import glob # 여러 fold 모델을 찾기 위해 추가
+import time
 import traceback
 import json
 
+try:
+    # libjpeg-turbo 기반 JPEG 디코더 (torchvision 빌드에 따라 없을 수 있음)
+    from torchvision.io import decode_jpeg, ImageReadMode
+except ImportError:
+    decode_jpeg = None
+
 # ==============================================================================
 # ⚙️ 1. 추론 설정 (CONFIGURATION)
 # ==============================================================================
@@ -18,6 +25,10 @@ class InferenceConfig:
     TILE_SIZE = 224
     STRIDE = 112
     INFERENCE_BATCH_SIZE = 8
+    ENABLE_BATCH_AUTOTUNE = True                    # 모델 로드 시 CPU 최적 배치 크기 측정
+    BATCH_AUTOTUNE_CANDIDATES = (1, 2, 4, 8, 16, 32)
+    BATCH_AUTOTUNE_BUDGET_SEC = 1.0                 # 측정 시간 상한 (앙상블의 첫 fold에서만 측정)
+    BATCH_AUTOTUNE_REPEATS = 2                      # 후보당 측정 횟수 (최솟값 사용)
     ENABLE_FIVECROP_TTA = True
     FIVECROP_BASE_SIZE = 256
     AGGREGATION_MODE = "topk_mean"
@@ -70,57 +81,114 @@ def aggregate_predictions(logits_TxC, mode, topk):
     else:
         raise ValueError(f"알 수 없는 집계 모드: {mode}")
 
+def decode_image(image_bytes):
+    """이미지 바이트를 RGB PIL 이미지로 디코딩 (JPEG는 torchvision 디코더 우선, 그 외/실패 시 PIL)"""
+    if decode_jpeg is not None and image_bytes[:2] == b"\xff\xd8":
+        try:
+            data = torch.frombuffer(bytearray(image_bytes), dtype=torch.uint8)
+            return TF.to_pil_image(decode_jpeg(data, mode=ImageReadMode.RGB))
+        except Exception:
+            pass
+    return Image.open(io.BytesIO(image_bytes))
+
+def build_tile_tensor(image_bytes, cfg):
+    """이미지 바이트 → uint8 타일 텐서 (T, [5,] 3, H, W), 타일이 없으면 None.
+    앙상블의 fold들이 호출 1번 동안 공유하고, 정규화(float 변환)는 배치 단위로 추론 직전에 수행
+    (전체 타일을 float32로 쌓는 것보다 메모리 1/4)"""
+    image = decode_image(image_bytes)
+    tile_dataset = TileDataset(image, cfg.TILE_SIZE, cfg.STRIDE, TF.pil_to_tensor,
+                               cfg.ENABLE_FIVECROP_TTA, cfg.FIVECROP_BASE_SIZE)
+    if len(tile_dataset) == 0: return None
+    return torch.stack([tile_dataset[i] for i in range(len(tile_dataset))])
+
 # ==============================================================================
 # 3. 추론기 클래스
 # ==============================================================================
 class PlantDiseaseClassifier:
     """단일 모델을 로드하고 고급 추론을 수행하는 클래스"""
-    def __init__(self, model_path, class_labels):
+    def __init__(self, model_path, class_labels, batch_size=None):
+        """batch_size: 같은 구조의 다른 fold에서 이미 측정한 배치 크기 (있으면 자동 측정 생략)"""
         self.device = torch.device("cpu")
         self.class_labels = class_labels
+        self.cfg = InferenceConfig()
+        self.effective_batch_size = batch_size or self.cfg.INFERENCE_BATCH_SIZE
+        self._tuned = batch_size is not None
         self.model = self._load_model(model_path)
         self.transform = self._get_transform()
-        self.cfg = InferenceConfig()
 
     def _load_model(self, path):
         try:
             model = torch.jit.load(path, map_location=self.device)
             model.to(self.device).eval()
             print(f"✅ TorchScript 모델 로드 성공: {path}")
-            return model
         except Exception as e:
             print(f"❌ TorchScript 모델 로드 실패: {path}, 에러: {e}")
             traceback.print_exc()
             return None
+        if self.cfg.ENABLE_BATCH_AUTOTUNE and not self._tuned:
+            self.effective_batch_size = self._autotune_batch_size(model)
+        return model
+
+    def _autotune_batch_size(self, model):
+        """후보 배치 크기별로 더미 입력 추론 시간을 재서 타일당 시간이 가장 짧은 값을 고른다.
+        후보는 작은 것부터 재며, 직전 측정의 타일당 시간으로 예상한 소요가 남은 예산을 넘으면 중단"""
+        n_crops = 5 if self.cfg.ENABLE_FIVECROP_TTA else 1
+        size = self.cfg.TILE_SIZE
+        repeats = max(1, self.cfg.BATCH_AUTOTUNE_REPEATS)
+        best_bs, best_cost = self.cfg.INFERENCE_BATCH_SIZE, float("inf")
+        deadline = time.perf_counter() + self.cfg.BATCH_AUTOTUNE_BUDGET_SEC
+        try:
+            with torch.no_grad():
+                t0 = time.perf_counter()
+                model(torch.zeros(1, 3, size, size))  # warm-up (첫 호출의 JIT 최적화 비용 제외)
+                # 타일당 시간 추정 (첫 후보는 warm-up 1장 × crop 수로, 이후는 직전 측정값으로 예측)
+                per_tile = (time.perf_counter() - t0) * n_crops
+                for bs in sorted(self.cfg.BATCH_AUTOTUNE_CANDIDATES):
+                    if per_tile * bs * repeats > deadline - time.perf_counter():
+                        break
+                    dummy = torch.zeros(bs * n_crops, 3, size, size)
+                    elapsed = []
+                    for _ in range(repeats):
+                        t0 = time.perf_counter()
+                        model(dummy)
+                        elapsed.append(time.perf_counter() - t0)
+                    per_tile = min(elapsed) / bs  # 최솟값: 스케줄링 잡음 제외
+                    if per_tile < best_cost:
+                        best_bs, best_cost = bs, per_tile
+        except Exception as e:
+            print(f"⚠️ 배치 크기 자동 측정 실패, 기본값 사용: {e}")
+            return self.cfg.INFERENCE_BATCH_SIZE
+        print(f"➡️ 자동 선택된 추론 배치 크기: {best_bs}")
+        return best_bs
 
     def _get_transform(self):
-        return transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # uint8 타일 배치 → float [0,1] 변환 후 적용 (ToTensor + Normalize와 같은 연산)
+        return transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
 
-    def predict_probabilities(self, image_bytes):
-        """이미지를 받아 최종 확률 벡터(agg_probs)를 반환"""
+    def predict_probabilities(self, image_bytes, tiles=None):
+        """이미지를 받아 최종 확률 벡터(agg_probs)를 반환
+        tiles: build_tile_tensor()로 미리 만든 타일 (앙상블에서 fold 간 공유), 없으면 여기서 생성"""
         if not self.model: return None
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            tile_dataset = TileDataset(image, self.cfg.TILE_SIZE, self.cfg.STRIDE, self.transform,
-                                       self.cfg.ENABLE_FIVECROP_TTA, self.cfg.FIVECROP_BASE_SIZE)
-            if len(tile_dataset) == 0: return None
-            tile_loader = DataLoader(tile_dataset, batch_size=self.cfg.INFERENCE_BATCH_SIZE, num_workers=0)
-            all_logits = []
+            if tiles is None:
+                tiles = build_tile_tensor(image_bytes, self.cfg)
+            if tiles is None: return None
+            num_tiles = tiles.size(0)
+            all_logits = None  # 첫 배치에서 (num_tiles, num_classes)로 한 번만 할당
             with torch.no_grad():
-                for batch in tile_loader:
+                for start in range(0, num_tiles, self.effective_batch_size):
+                    batch = tiles[start:start + self.effective_batch_size]
                     if self.cfg.ENABLE_FIVECROP_TTA:
                         bs, n_crops, c, h, w = batch.shape
                         batch = batch.view(-1, c, h, w)
-                    batch = batch.to(self.device)
+                    batch = self.transform(batch.to(self.device, torch.float32).div_(255))
                     logits = (self.model(batch) + self.model(torch.flip(batch, dims=[3]))) / 2.0
                     if self.cfg.ENABLE_FIVECROP_TTA:
                         logits = logits.view(bs, n_crops, -1).mean(dim=1)
-                    all_logits.append(logits.cpu())
-            all_logits_tensor = torch.cat(all_logits, dim=0)
-            return aggregate_predictions(all_logits_tensor, self.cfg.AGGREGATION_MODE, self.cfg.TOP_K_TILES)
+                    if all_logits is None:
+                        all_logits = torch.empty(num_tiles, logits.size(1))
+                    all_logits[start:start + logits.size(0)].copy_(logits)
+            return aggregate_predictions(all_logits, self.cfg.AGGREGATION_MODE, self.cfg.TOP_K_TILES)
         except Exception:
             print("predict_probabilities exception")
             traceback.print_exc()
@@ -133,9 +201,19 @@ class EnsembleClassifier:
         self.class_labels = class_labels
 
     def predict(self, image_bytes):
+        # 타일은 호출마다 1번만 만들어 모든 fold가 공유 (모듈 전역 캐시 없이 호출이 끝나면 해제)
+        try:
+            tiles = build_tile_tensor(image_bytes, self.classifiers[0].cfg)
+        except Exception:
+            print("build_tile_tensor exception")
+            traceback.print_exc()
+            tiles = None
+        if tiles is None:
+            return {"error": "모든 fold 모델에서 추론에 실패했습니다."}
+
         all_probs = []
         for classifier in self.classifiers:
-            probs = classifier.predict_probabilities(image_bytes)
+            probs = classifier.predict_probabilities(image_bytes, tiles)
             if probs is not None:
                 all_probs.append(probs)
 
@@ -221,10 +299,12 @@ class ModelManager:
 
         # 3. 각 fold 모델에 대한 분류기 생성
         individual_classifiers = []
+        batch_size = None  # fold들은 같은 구조 → 첫 fold에서 측정한 배치 크기를 나머지에 재사용
         for model_path in sorted(model_paths):
-            classifier = PlantDiseaseClassifier(model_path, class_labels)
+            classifier = PlantDiseaseClassifier(model_path, class_labels, batch_size=batch_size)
             if classifier.model: # 모델 로딩 성공 시에만 추가
                 individual_classifiers.append(classifier)
+                batch_size = classifier.effective_batch_size
 
         if not individual_classifiers:
             print(f"❌ 에러: '{effective_plant_type}'의 모델을 하나도 로드하지 못했습니다.")
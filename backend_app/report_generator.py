@@ -1,20 +1,35 @@
 # PDF 보고서 생성
 import os
 import socket
+import mmap
 import json
+import re
+import unicodedata
+import functools
+import contextlib
 from datetime import datetime, timedelta, timezone
 import pytz
 import smtplib
 import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import matplotlib
+matplotlib.use("Agg")  # 헤드리스 렌더링 (워커 프로세스 포함)
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image as PILImage
 import matplotlib.font_manager as fm
 import matplotlib.dates as mdates
+import matplotlib.transforms as mtransforms
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm, mm
 from reportlab.lib import colors
-from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak, KeepInFrame, KeepTogether)
+from reportlab.platypus import (SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak, KeepInFrame, KeepTogether, Flowable)
 from reportlab.lib.utils import ImageReader
+from reportlab import rl_config
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib import colors
 import io
@@ -24,11 +39,23 @@ from email.mime.text import MIMEText
 from email.header import Header
 from email.utils import formataddr
 from dotenv import load_dotenv
-from .services import connect_influxdb, query_influxdb_data, get_influx_client
-from .database import get_db_connection, get_all_devices_any, get_all_users, get_device_by_device_id_any, get_all_devices
+from .services import connect_influxdb, query_influxdb_data_df, get_influx_client
+from .database import get_db_connection, get_all_devices_any, get_all_users, get_device_by_device_id_any
 from pathlib import Path
 import pandas as pd
+import numpy as np
 from typing import List, Tuple, Optional
+
+try:
+    from numba import njit as _njit  # 선택 의존성: 있으면 이탈 구간 탐색 루프를 JIT 컴파일
+except ImportError:
+    _njit = None
+
+try:
+    import python_calamine  # noqa: F401  (pandas read_excel engine="calamine")
+    _EXCEL_ENGINES = ("calamine", "openpyxl", None)
+except ImportError:
+    _EXCEL_ENGINES = ("openpyxl", None)
 import math
 
 load_dotenv()
@@ -81,10 +108,164 @@ def _setup_fonts_unified():
 # 전역 기본 폰트명
 BASE_FONT = _setup_fonts_unified()
 
+def _build_styles():
+    """리포트 Paragraph 스타일을 한 번만 만들어 둔다 (리포트마다 getSampleStyleSheet()/ParagraphStyle 생성 X)
+    만든 뒤에는 읽기만 하므로 스레드/리포트 간 공유해도 안전"""
+    styles = getSampleStyleSheet()
+
+    # 스타일 정의/보정 (먼저 추가 → 이후 정렬 변경)
+    styles.add(ParagraphStyle(name='NotoTitle',    parent=styles['Title'],    fontName=BASE_FONT))
+    styles.add(ParagraphStyle(name='NotoNormal',   parent=styles['Normal'],   fontName=BASE_FONT))
+    styles.add(ParagraphStyle(name='NotoHeading4', parent=styles['Heading4'], fontName=BASE_FONT))
+    for st in styles.byName.values():
+        st.fontName = BASE_FONT
+    styles['NotoTitle'].alignment = 0  # 제목 왼쪽 정렬
+
+    # 우측 메타 스타일(작은 글자, 옅은 색, 오른쪽 정렬)
+    styles.add(ParagraphStyle(
+        name='MetaRight',
+        parent=styles['NotoNormal'],
+        alignment=2,  # RIGHT
+        fontSize=8.5,
+        textColor=colors.HexColor("#64748B"),
+        leading=11,
+        wordWrap='CJK'
+    ))
+
+    # 카드
+    styles.add(ParagraphStyle(
+        name='CardTitle', parent=styles['NotoNormal'],
+        fontSize=10.5, leading=13, spaceAfter=1
+    ))
+    styles.add(ParagraphStyle(
+        name='CardMeta', parent=styles['NotoNormal'],
+        fontSize=9.5, leading=12
+    ))
+    styles.add(ParagraphStyle(
+        name='CardRange', parent=styles['NotoNormal'],
+        fontSize=8.5, leading=11, textColor=colors.HexColor("#64748B")
+    ))
+    # 칩(최근값) 글자색: 기본 / 경고
+    styles.add(ParagraphStyle(name='Chip', parent=styles['NotoNormal'],
+                              fontSize=10, textColor=colors.HexColor("#0F172A")))
+    styles.add(ParagraphStyle(name='ChipWarn', parent=styles['NotoNormal'],
+                              fontSize=10, textColor=colors.HexColor("#B91C1C")))
+
+    # AI 한줄 코멘트 & 관리 팁
+    styles.add(ParagraphStyle(name='AiBoxTitle',
+        parent=styles['NotoHeading4'], fontSize=11, leading=13))
+    styles.add(ParagraphStyle(name='AiBoxText',
+        parent=styles['NotoNormal'], fontSize=9.3, leading=11))
+    return styles
+
+STYLES = _build_styles()
+
+# 리포트 표 스타일 — 고정값은 모듈 로드 시 1번만 만들고 모든 리포트에서 공유 (setStyle은 명령을 읽기만 함)
+_TS_META = TableStyle([
+    ('ALIGN',         (0,0), (-1,-1), 'RIGHT'),
+    ('VALIGN',        (0,0), (-1,-1), 'TOP'),
+    ('LEFTPADDING',   (0,0), (-1,-1), 0),
+    ('RIGHTPADDING',  (0,0), (-1,-1), 0),
+    ('TOPPADDING',    (0,0), (-1,-1), 0),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 0),
+])
+_TS_HEADER_LEFT = TableStyle([
+    ('ALIGN',        (0,0), (-1,-1), 'LEFT'),
+    ('VALIGN',       (0,0), (-1,-1), 'TOP'),
+    ('LEFTPADDING',  (0,0), (-1,-1), 0),
+    ('RIGHTPADDING', (0,0), (-1,-1), 0),
+    ('TOPPADDING',   (0,0), (-1,-1), 0),
+    ('BOTTOMPADDING',(0,0), (-1,-1), 0),
+])
+_TS_HEADER = TableStyle([
+    ('VALIGN',        (0,0), (-1,-1), 'TOP'),
+    ('ALIGN',         (0,0), (0,0),   'LEFT'),
+    ('ALIGN',         (1,0), (1,0),   'RIGHT'),
+    ('LEFTPADDING',   (0,0), (-1,-1), 0),
+    ('RIGHTPADDING',  (0,0), (-1,-1), 0),
+    ('TOPPADDING',    (0,0), (-1,-1), 0),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 2),
+    ('LINEBELOW',     (0,0), (-1,0), 0.8, colors.HexColor("#E5E7EB")),
+    # ▶ 우측 셀만 바닥 정렬 & 패딩 살짝 축소해 룰과 더 가까이
+    ('VALIGN',        (1,0), (1,0), 'BOTTOM'),
+    ('BOTTOMPADDING', (1,0), (1,0), 1),
+])
+_TS_CARD_CONTENT = TableStyle([
+    ('ALIGN',        (0,0), (-1,-1), 'LEFT'),
+    ('VALIGN',       (0,0), (-1,-1), 'TOP'),
+    ('LEFTPADDING',  (0,0), (-1,-1), 6),
+    ('RIGHTPADDING', (0,0), (-1,-1), 6),
+    ('TOPPADDING',   (0,0), (-1,-1), 5),
+    ('BOTTOMPADDING',(0,0), (-1,-1), 5),
+])
+_TS_CARDS_ROW = TableStyle([
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('LEFTPADDING', (0,0), (-1,-1), 0),
+    ('RIGHTPADDING', (0,0), (-1,-1), 0),
+    ('TOPPADDING', (0,0), (-1,-1), 0),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 0),
+])
+_TS_AI_TITLE_RULE = TableStyle([
+    ('LINEBELOW', (0,0), (-1,-1), 0.5, colors.HexColor("#E5E7EB")),
+    ('LEFTPADDING', (0,0), (-1,-1), 0),
+    ('RIGHTPADDING',(0,0), (-1,-1), 0),
+    ('TOPPADDING',  (0,0), (-1,-1), 0),
+    ('BOTTOMPADDING',(0,0),(-1,-1), 6),
+])
+_TS_AI_LINES = TableStyle([
+    ('VALIGN', (0,0), (-1,-1), 'TOP'),
+    ('LEFTPADDING', (0,0), (-1,-1), 0),
+    ('RIGHTPADDING',(0,0), (-1,-1), 0),
+    ('TOPPADDING',  (0,0), (-1,-1), 1),
+    ('BOTTOMPADDING',(0,0), (-1,-1), 1),
+    # 칼럼 사이 가터를 넣기 위해 빈 컬럼 대신 내부 오른쪽 패딩만 살짝
+])
+_TS_AI_BOX = TableStyle([
+    ('LEFTPADDING',   (0,0), (-1,-1), 4),
+    ('RIGHTPADDING',  (0,0), (-1,-1), 4),
+    ('TOPPADDING',    (0,0), (-1,-1), 5),
+    ('BOTTOMPADDING', (0,0), (-1,-1), 5),
+    ('BOX',           (0,0), (-1,-1), 0.7, colors.HexColor("#CBD5E1")),
+    ('BACKGROUND',    (0,0), (-1,-1), colors.white),
+])
+# 최근값 칩: warn 여부별 배경색만 다름
+_TS_CHIP = {
+    warn: TableStyle([
+        ('LEFTPADDING', (0,0), (-1,-1), 4),
+        ('RIGHTPADDING',(0,0), (-1,-1), 4),
+        ('TOPPADDING',  (0,0), (-1,-1), 2),
+        ('BOTTOMPADDING',(0,0),(-1,-1), 2),
+        ('BACKGROUND',  (0,0), (-1,-1), colors.HexColor("#FDECEC" if warn else "#F1F5F9")),
+        ('BOX',         (0,0), (-1,-1), 0.3, colors.HexColor("#E2E8F0")),
+        ('ROUNDRECT',   (0,0), (-1,-1), 2, 2),
+        ('ALIGN',       (0,0), (-1,-1), 'LEFT'),
+    ])
+    for warn in (False, True)
+}
+
+@functools.lru_cache(maxsize=None)
+def _card_box_style(border_hex: str) -> TableStyle:
+    """카드 외곽 스타일 (테두리 색 몇 가지뿐이라 색별로 1번만 생성)"""
+    return TableStyle([
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('VALIGN', (0,0), (-1,-1), 'TOP'),
+        ('LEFTPADDING', (0,0), (-1,-1), 0),
+        ('RIGHTPADDING', (0,0), (-1,-1), 0),
+        ('TOPPADDING', (0,0), (-1,-1), 0),
+        ('BOTTOMPADDING', (0,0), (-1,-1), 0),
+        ('BACKGROUND', (0,0), (-1,-1), colors.white),
+        ('BOX', (0,0), (-1,-1), 0.6, colors.HexColor(border_hex)),
+    ])
+
 font_prop = None
 
 #테스트로 window 5분
 REPORT_AGG_WINDOW = os.getenv("REPORT_AGG_WINDOW", "1h")
+REPORT_MAX_ROWS = int(os.getenv("REPORT_MAX_ROWS", "300"))  # 디바이스당 최대 집계 행 수 (긴 기간은 집계 구간을 늘림)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", str(os.cpu_count() or 1)))
+REPORT_THREADS = int(os.getenv("REPORT_THREADS", "2"))  # 프로세스 풀을 못 쓸 때 동시 생성 수
+REPORT_FETCH_CHUNK = int(os.getenv("REPORT_FETCH_CHUNK", "50"))  # Influx 1회 조회당 디바이스 수 (다음 묶음 조회와 렌더링을 겹침)
+REPORT_PDF_TO_DISK = os.getenv("REPORT_PDF_TO_DISK", "0") == "1"  # 디버그: PDF를 임시 폴더에 파일로 남김
 
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
@@ -124,6 +305,14 @@ def week_window_kst(reference_utc: datetime) -> tuple[datetime, datetime]:
     start_kst = end_kst - timedelta(days=7)
     return start_kst.astimezone(pytz.utc), end_kst.astimezone(pytz.utc)
 
+# 이름 정규화/파일명/디바이스ID 판정용 정규식 (모듈 로드 시 1회 컴파일)
+_RE_WS             = re.compile(r"\s+")
+_RE_PAREN          = re.compile(r"\(([^)]+)\)")
+_RE_BRACKETS_STRIP = re.compile(r"\([^)]*\)")
+_RE_NON_ASCII_SAFE = re.compile(r"[^A-Za-z0-9._-]+")
+_RE_SCI_ID         = re.compile(r"[0-9]+e\+[0-9]+", re.I)
+_RE_FLUX_DURATION  = re.compile(r"^(\d+)([smhd])$")
+
 def _looks_mojibake(s: Optional[str]) -> bool:
     """
     None/공백이거나, 물음표가 포함된 경우(특히 '??' 이상)를 오염으로 간주.
@@ -138,8 +327,7 @@ def _looks_mojibake(s: Optional[str]) -> bool:
     if "??" in t:
         return True
     # 괄호 안 내용 제거 후 다시 검사
-    import re
-    core = re.sub(r"\([^)]*\)", "", t)
+    core = _RE_BRACKETS_STRIP.sub("", t)
     q = core.count('?')
     alnum = sum(ch.isalnum() for ch in core)
     return q >= 2 and alnum == 0
@@ -150,64 +338,113 @@ def _display_text(s: Optional[str]) -> str:
 
 def _ascii_slug(s: Optional[str]) -> str:
     """파일명 안전화 전용(표시문구와 절대 섞지 않음)."""
-    import re, unicodedata
     s = "" if s is None else str(s)
     s = unicodedata.normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
-    s = re.sub(r"[^A-Za-z0-9._-]+", "_", s).strip("_")
+    s = _RE_NON_ASCII_SAFE.sub("_", s).strip("_")
     return s or "report"
 
 def _fmt_iso_utc(dt):
     return dt.astimezone(pytz.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
 
-def generate_graph_image(rows, field, label, lo=None, hi=None):
-    def _to_float(v):
-        try:
-            return float(v)
-        except Exception:
-            return None
-
-    times, values = [], []
-    for r in rows:
-        v = _to_float(r.get(field))
-        if v is None:
-            continue
-        t = r.get("_time")
-        if not isinstance(t, datetime) and t is not None:
-            t = datetime.fromisoformat(str(t).replace("Z", "+00:00"))
-        times.append(t)
-        values.append(v)
-
+_SUBPLOT_KEYS = ("left", "right", "bottom", "top")
+GRAPH_MAX_POINTS = 2000
+# 그래프 이미지 스트림은 바이너리(Flate)로만 기록 — ASCII85 인코딩은 CPU를 쓰고 크기만 25% 늘림
+rl_config.useA85 = 0
+GRAPH_DPI = 110  # A4 셀 폭(9.3cm)에서는 180dpi가 구분되지 않음
+GRAPH_WORKERS = int(os.getenv("GRAPH_WORKERS", "3"))
+_graph_local = threading.local()
+_graph_pool_lock = threading.Lock()
+_graph_pool_state = (None, None)  # (pid, ThreadPoolExecutor)
+
+def _graph_pool() -> ThreadPoolExecutor:
+    """그래프 렌더링용 스레드 풀을 프로세스당 1개만 만들어 재사용
+    스레드가 유지되므로 스레드별 Figure(_thread_axes)도 리포트 간에 재사용된다.
+    fork된 워커 프로세스에는 부모의 스레드가 없으므로 pid가 바뀌면 새로 만든다."""
+    global _graph_pool_state
+    pid, pool = _graph_pool_state
+    if pool is None or pid != os.getpid():
+        with _graph_pool_lock:
+            pid, pool = _graph_pool_state
+            if pool is None or pid != os.getpid():
+                pool = ThreadPoolExecutor(max_workers=GRAPH_WORKERS, thread_name_prefix="graph")
+                _graph_pool_state = (os.getpid(), pool)
+    return pool
+
+def _thread_axes():
+    """스레드별 Figure/Axes 1개를 만들어 재사용 (Figure는 스레드 간 공유 불가)
+    pyplot 전역 상태를 거치지 않도록 Figure를 직접 생성"""
+    ax = getattr(_graph_local, "ax", None)
+    if ax is None:
+        fig = Figure(figsize=(6, 2.5), dpi=GRAPH_DPI)
+        FigureCanvasAgg(fig)
+        ax = _graph_local.ax = fig.add_subplot()
+    return ax
+
+def _clear_graph_axes(ax):
+    """재사용 Axes에서 이전 그래프의 데이터 아티스트(선/음영/마커/범례)만 걷어냄.
+    cla()는 축 눈금(Tick) 객체까지 버려서 tight_layout/draw 때마다 다시 만들게 되므로
+    축은 그대로 두고 데이터 범위/자동 스케일/색 순서만 새 Axes와 같게 되돌린다."""
+    for artist in (*ax.lines, *ax.collections):
+        artist.remove()
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.remove()
+    ax.dataLim.set_points(mtransforms.Bbox.null().get_points())
+    ax.ignore_existing_data_limits = True
+    ax.set_autoscale_on(True)   # 이전 그래프의 set_xlim()이 끈 x축 자동 스케일 복구
+    ax.set_prop_cycle(None)     # 선/음영/마커 색이 매번 C0부터 시작하도록
+
+def _render_one_graph(task):
+    times, values, field, label, lo, hi = task
+    return generate_graph_image(times, values, field, label, lo=lo, hi=hi)
+
+def generate_graph_image(times, values, field, label, lo=None, hi=None, ax=None):
+    """times: datetime64 배열(UTC), values: float 배열 — _field_series()로 결측치가 제거된 값
+    ax를 넘기지 않으면 현재 스레드의 재사용 Figure/Axes(_thread_axes)에 그린다 (데이터만 지우고 축은 유지).
+    넘긴 Axes는 cla()로 비우고 그린다. 어느 쪽이든 그래프마다 Figure를 만들고 닫지 않는다.
+    반환: PIL RGB 이미지 (데이터가 없으면 None)"""
     print(f"[GRAPH DEBUG] field={field}, data points={len(values)}")
-    if not times or not values:
+    if len(times) == 0 or len(values) == 0:
         return None
 
-    fig, ax = plt.subplots(figsize=(6, 2.5), dpi=100)
+    if ax is None:
+        ax = _thread_axes()
+        _clear_graph_axes(ax)
+    else:
+        ax.cla()
+    fig = ax.figure
+    # 이전 그래프의 tight_layout 여백이 남지 않도록 기본값으로 되돌림
+    fig.subplots_adjust(**{k: plt.rcParams[f"figure.subplot.{k}"] for k in _SUBPLOT_KEYS})
+
+    # 포인트가 너무 많으면 간격을 두고 추려서 그림 (이탈 포인트는 전체 데이터 기준)
+    stride = -(-len(values) // GRAPH_MAX_POINTS)
+    t_plot, v_plot = (times[::stride], values[::stride]) if stride > 1 else (times, values)
 
     # ① 정상범위 음영
     if lo is not None or hi is not None:
-        lo_line = lo if lo is not None else min(values)
-        hi_line = hi if hi is not None else max(values)
-        ax.fill_between(times, lo_line, hi_line, alpha=0.12, step="pre", zorder=0)
+        lo_line = lo if lo is not None else values.min()
+        hi_line = hi if hi is not None else values.max()
+        ax.fill_between(times[[0, -1]], lo_line, hi_line, alpha=0.12, zorder=0, label="정상범위")
 
-    # ② 메인 라인
-    ax.plot(times, values, linewidth=1.6, marker='o', markersize=2.5, zorder=2)
+    # ② 메인 라인 + 포인트 (마커는 scatter 한 번으로 일괄 처리)
+    line, = ax.plot(t_plot, v_plot, linewidth=1.6, zorder=2, label="측정값")
+    ax.scatter(t_plot, v_plot, s=6, color=line.get_color(), zorder=2, label="_nolegend_")
 
     # ③ 이탈 포인트 마커
     if lo is not None or hi is not None:
-        xs = mdates.date2num(times)
-        import numpy as np
-        vals = np.array(values, dtype=float)
-        mask_low  = (lo is not None) & (vals <  lo)
-        mask_high = (hi is not None) & (vals >  hi)
+        mask_low  = (values < lo) if lo is not None else np.zeros(len(values), dtype=bool)
+        mask_high = (values > hi) if hi is not None else np.zeros(len(values), dtype=bool)
+        out_label = "이탈 포인트"
         if mask_low.any():
-            ax.scatter(xs[mask_low], vals[mask_low], s=14, marker='o', zorder=3)
+            ax.scatter(times[mask_low], values[mask_low], s=14, marker='o', zorder=3, label=out_label)
+            out_label = "_nolegend_"
         if mask_high.any():
-            ax.scatter(xs[mask_high], vals[mask_high], s=14, marker='^', zorder=3)
+            ax.scatter(times[mask_high], values[mask_high], s=14, marker='^', zorder=3, label=out_label)
 
     # X축 눈금/포맷
-    tmin, tmax = min(times), max(times)
+    tmin, tmax = times.min(), times.max()
     if tmin == tmax:
-        pad = timedelta(minutes=5)
+        pad = np.timedelta64(5, "m")
         ax.set_xlim(tmin - pad, tmax + pad)
     else:
         ax.set_xlim(tmin, tmax)
@@ -225,38 +462,57 @@ def generate_graph_image(rows, field, label, lo=None, hi=None):
 
     ax.set_xlabel("시간")
     ax.grid(True)
-    ax.legend(
-        [lbl for lbl in ["측정값", "정상범위", "이탈 포인트"] if True],
-        loc="upper right", fontsize=8
-    )
+    ax.legend(loc="upper right", fontsize=8)
     fig.tight_layout(pad=0.2)
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=180, bbox_inches="tight", pad_inches=0.02)
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+    # PNG 인코딩/디코딩 없이 Agg 픽셀 버퍼를 그대로 PIL 이미지로 (PDF에 쓸 때 한 번만 압축됨)
+    # Figure를 재사용하므로 버퍼는 복사해 둔다 (배경이 불투명하므로 RGB만)
+    fig.canvas.draw()
+    return PILImage.fromarray(np.ascontiguousarray(np.asarray(fig.canvas.buffer_rgba())[..., :3]))
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 정상 범위 로딩 / 조회
 #   - standards 파일은 열(Column) 이름 예: plant(식물명), temperature_min/max, humidity_min/max, ...
 #   - 프로젝트 내 실제 컬럼명에 맞춰 key 매핑을 조정하세요.
 # ─────────────────────────────────────────────────────────────────────────────
-def _parse_range(s):
-    """'10 ~ 20' 같은 문자열을 (10.0, 20.0)로 변환"""
-    if s is None:
-        return (None, None)
-    try:
-        txt = str(s).replace('~', ' ~ ').replace('−', '-')
-        parts = [p.strip() for p in txt.split('~')]
-        if len(parts) == 2:
-            lo = float(parts[0].replace(',', '').split()[0])
-            hi = float(parts[1].replace(',', '').split()[0])
-            return (lo, hi)
-    except:
-        pass
-    return (None, None)
+# '10 ~ 20', '1,000~20,000', '−5 ~ 800' → 각 쪽의 첫 토큰
+_RANGE_RE = re.compile(r"^\s*([^\s~]+)[^~]*~\s*([^\s~]+)[^~]*$")
+_RANGE_TRANS = {ord("−"): "-", ord(","): None}  # 유니코드 마이너스 → '-', 천 단위 쉼표 제거
+
+def _parse_range_columns(cols: pd.DataFrame) -> np.ndarray:
+    """범위 문자열 컬럼 여러 개를 세로로 이어 붙여 translate/extract 1번으로 (min, max) float 변환.
+    반환: (컬럼 수, 행 수, 2) 배열 (한쪽이라도 해석 불가면 둘 다 NaN)"""
+    n_rows, n_cols = cols.shape
+    txt = pd.Series(cols.to_numpy(dtype=object).ravel(order="F")).astype(str).str.translate(_RANGE_TRANS)
+    parts = txt.str.extract(_RANGE_RE).apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float, copy=True)
+    parts[np.isnan(parts).any(axis=1)] = np.nan
+    return parts.reshape(n_cols, n_rows, 2)
+
+STANDARDS_CHECK_SEC = 30  # 정상 범위 파일 수정 여부(stat) 재확인 간격
+_standards_stat = (0.0, None)  # (마지막 확인 시각 monotonic, (mtime_ns, size))
 
 def load_standards() -> Optional[pd.DataFrame]:
+    """
+    정상 범위 엑셀을 읽어 정규화된 DataFrame 반환.
+    파일 (수정시각 ns, 크기)를 키로 캐시하므로 파일이 바뀌지 않는 한 한 번만 파싱한다.
+    (초 단위 mtime만 보면 같은 초 안에 교체된 파일을 놓칠 수 있어 ns + 크기를 함께 사용)
+    stat 확인도 STANDARDS_CHECK_SEC 간격으로만 한다 (리포트마다 파일시스템 조회 X).
+    (반환된 DataFrame은 공유 객체이므로 수정하지 말 것)
+    """
+    global _standards_stat
+    checked_at, key = _standards_stat
+    now = time.monotonic()
+    if key is None or now - checked_at > STANDARDS_CHECK_SEC:
+        try:
+            st = STANDARDS_PATH.stat()
+        except OSError as e:
+            print(f"[WARN] could not load standards: {e}")
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        _standards_stat = (now, key)
+    return _load_standards_cached(key)
+
+@functools.lru_cache(maxsize=1)
+def _load_standards_cached(key: tuple) -> Optional[pd.DataFrame]:
     """
     엑셀의 한글 컬럼/문자열 범위를 내부 표준 컬럼으로 정규화:
       식물명 → plant_name
@@ -267,17 +523,18 @@ def load_standards() -> Optional[pd.DataFrame]:
       토양수분(%) → soil_moisture_min/max
       토양전도도(uS/cm) → soil_ec_min/max
     """
-    try:
-        # [ADD] openpyxl 엔진 우선 시도 (컨테이너에 openpyxl 설치 시 안정)
-        df = pd.read_excel(STANDARDS_PATH, engine="openpyxl")
-    except Exception as e:
-        print(f"[WARN] could not load standards: {e}")
-        # [ADD] 엔진 미설치 등으로 실패하면 기본 엔진 한 번 더 시도
+    # calamine(빠름) → openpyxl → pandas 기본 엔진 순으로 시도 (엔진 미설치 시 다음으로)
+    # openpyxl은 pandas가 이미 read_only=True로 연다
+    df = None
+    for engine in _EXCEL_ENGINES:
         try:
-            df = pd.read_excel(STANDARDS_PATH)
-        except Exception as e2:
-            print(f"[WARN] fallback read_excel also failed: {e2} (path={STANDARDS_PATH})")
-            return None
+            df = pd.read_excel(STANDARDS_PATH, engine=engine)
+            break
+        except Exception as e:
+            print(f"[WARN] read_excel(engine={engine}) failed: {e}")
+    if df is None:
+        print(f"[WARN] could not load standards (path={STANDARDS_PATH})")
+        return None
 
     # 1) 컬럼명 공백 제거
     df.columns = [str(c).strip() for c in df.columns]
@@ -308,33 +565,43 @@ def load_standards() -> Optional[pd.DataFrame]:
         .astype(str).str.strip().str.lower()
     )
 
-    # 4) 각 항목을 min/max 숫자 컬럼으로 분해
-    def split_to_minmax(colname, out_prefix):
-        if colname not in df.columns:
-            return
-        mins, maxs = zip(*df[colname].map(_parse_range))
-        df[f"{out_prefix}_min"] = mins
-        df[f"{out_prefix}_max"] = maxs
-
-    split_to_minmax(COLS["temperature"],   "temperature")
-    split_to_minmax(COLS["humidity"],      "humidity")
-    split_to_minmax(COLS["light_lux"],     "light_lux")
-    split_to_minmax(COLS["soil_temp"],     "soil_temp")
-    split_to_minmax(COLS["soil_moisture"], "soil_moisture")
-    split_to_minmax(COLS["soil_ec"],       "soil_ec")
+    # 4) 각 항목을 min/max 숫자 컬럼으로 분해 (있는 범위 컬럼 전부를 한 번에 파싱)
+    present = [(COLS[k], k) for k in RANGE_FIELDS if COLS[k] in df.columns]
+    if present:
+        minmax = _parse_range_columns(df[[c for c, _ in present]])
+        for (_, out_prefix), pair in zip(present, minmax):
+            df[[f"{out_prefix}_min", f"{out_prefix}_max"]] = pair
 
+    # 5) 식물명 → 항목별 (lo, hi) 조회 인덱스를 한 번만 만들어 둔다
+    df.attrs["range_index"] = _build_range_index(df)
     return df
 
+RANGE_FIELDS = ("temperature", "humidity", "light_lux", "soil_temp", "soil_moisture", "soil_ec")
+
+def _build_range_index(df: pd.DataFrame) -> dict:
+    """
+    get_range_robust용 조회 인덱스:
+      names: (정규화 식물명, {field: (lo, hi)}) 목록 (엑셀 행 순서 유지 → 첫 일치 행 우선)
+    """
+    # 엑셀 전체 컬럼을 행 dict로 펼치지 않고 필요한 min/max 컬럼만 float 목록으로 한 번에 꺼냄 (없는 컬럼은 None)
+    n = len(df)
+    cols = [df[c].to_numpy(dtype=float).tolist() if c in df.columns else [None] * n
+            for f in RANGE_FIELDS for c in (f"{f}_min", f"{f}_max")]
+    names = []
+    for name, *vals in zip(df["plant_name_norm"].astype(str), *cols):
+        ranges = {f: (vals[2*i], vals[2*i + 1]) for i, f in enumerate(RANGE_FIELDS)}
+        names.append((name, ranges))
+    return {"names": names}
+
 # 품종명 정규화 + 영문명 fallback을 포함한 견고한 범위 매칭 함수
-import re
 def _norm_name(s: str) -> str:
     s = str(s or "").strip().lower()
     s = s.replace("（","(").replace("）",")")
-    s = re.sub(r"\s+", " ", s)
+    s = _RE_WS.sub(" ", s)
     return s
 
 def _eng_in_paren(s: str) -> str:
-    m = re.search(r"\(([^)]+)\)", s or "")
+    m = _RE_PAREN.search(s or "")
     return (m.group(1).strip().lower() if m else "")
 
 def get_range_robust(standards: Optional[pd.DataFrame], plant_type: Optional[str], field: str):
@@ -342,80 +609,321 @@ def get_range_robust(standards: Optional[pd.DataFrame], plant_type: Optional[str
         return None, None
     if "plant_name_norm" not in standards.columns:
         return None, None
+    index = standards.attrs.get("range_index") or _build_range_index(standards)
+    # plant_type별 매칭 결과를 인덱스에 기억 → 같은 식물의 나머지 항목은 dict 조회 1번
+    resolved = index.setdefault("resolved", {})
+    if plant_type in resolved:
+        ranges = resolved[plant_type]
+    else:
+        ranges = resolved[plant_type] = _match_plant_ranges(index, plant_type)
+    if ranges is None:
+        return None, None
+    return ranges.get(field, (None, None))
+
+def _match_plant_ranges(index: dict, plant_type: str):
     key = _norm_name(plant_type)
     key_eng = _eng_in_paren(key)
-    # 1) 부분일치(전체 표기)
-    row = standards.loc[standards["plant_name_norm"].str.contains(re.escape(key), na=False)]
+    names = index["names"]
+    # 1) 부분일치(전체 표기) — 엑셀 행 순서상 첫 행
+    ranges = next((r for name, r in names if key in name), None)
     # 2) 영문명만으로 fallback
-    if row.empty and key_eng:
-        row = standards.loc[standards["plant_name_norm"].str.contains(re.escape(key_eng), na=False)]
+    if ranges is None and key_eng:
+        ranges = next((r for name, r in names if key_eng in name), None)
     # 3) 완전 일치 최종 시도
-    if row.empty:
-        row = standards.loc[standards["plant_name_norm"] == key]
-        if row.empty:
-            return None, None
-    lo_col = f"{field}_min"; hi_col = f"{field}_max"
-    lo = row.iloc[0].get(lo_col, None); hi = row.iloc[0].get(hi_col, None)
-    try: lo = float(lo) if lo is not None else None
-    except: lo = None
-    try: hi = float(hi) if hi is not None else None
-    except: hi = None
-    return lo, hi
+    if ranges is None:
+        ranges = next((r for name, r in names if name == key), None)
+    return ranges
 
 get_range = get_range_robust
 
-def _to_float(v):
-    try: return float(v)
-    except: return None
-
-def find_out_of_range_intervals(times: List[datetime], values: List[float], lo: Optional[float], hi: Optional[float]) -> List[Tuple[datetime, datetime, str]]:
+def _transitions_loop(v, lo, hi):
+    """이탈 구간 (시작 idx, 끝 idx, +1 high/-1 low) — lo/hi 미설정은 NaN. numba가 있으면 JIT 컴파일됨"""
+    n = v.shape[0]
+    starts = np.empty(n, dtype=np.int64)
+    ends   = np.empty(n, dtype=np.int64)
+    kinds  = np.empty(n, dtype=np.int8)
+    cnt = 0
+    prev = 0
+    for i in range(n):
+        x = v[i]
+        st = 0
+        if x > hi:      # high 우선 (NaN 비교는 항상 False)
+            st = 1
+        elif x < lo:
+            st = -1
+        if st != prev:
+            if prev != 0:
+                ends[cnt - 1] = i       # 직전 이탈 구간은 다음 상태가 시작되는 시각에서 끝남
+            if st != 0:
+                starts[cnt] = i
+                kinds[cnt] = st
+                cnt += 1
+            prev = st
+    if prev != 0:
+        ends[cnt - 1] = n - 1           # 마지막 구간은 마지막 시각
+    return starts[:cnt], ends[:cnt], kinds[:cnt]
+
+def _transitions_np(v, lo, hi):
+    """_transitions_loop와 같은 결과를 NumPy 연산으로 (numba 미설치 시)"""
+    state = np.zeros(len(v), dtype=np.int8)
+    state[v < lo] = -1
+    state[v > hi] = 1  # high 우선
+    change = np.flatnonzero(np.diff(state)) + 1
+    starts = np.r_[0, change]
+    ends   = np.r_[change, len(v) - 1]
+    out = state[starts] != 0
+    return starts[out], ends[out], state[starts][out]
+
+_find_transitions = _njit(cache=True)(_transitions_loop) if _njit else _transitions_np
+
+def find_out_of_range_intervals(times, values, lo: Optional[float], hi: Optional[float]) -> List[Tuple[datetime, datetime, str]]:
     """
     연속 구간 단위로 정상 범위를 벗어난 시간대를 찾아 (start, end, 'high'|'low') 리스트로 반환
+    - 각 점의 상태(+1 high / -1 low / 0 정상)가 바뀌는 지점으로 구간을 나눈다 (_find_transitions)
+    - 구간의 끝은 다음 상태가 시작되는 시각(마지막 구간은 마지막 시각)
     """
-    if not times or not values or (lo is None and hi is None):
+    if len(times) == 0 or len(values) == 0 or (lo is None and hi is None):
         return []
-    out = []
-    cur_state = None  # 'high' | 'low' | None
-    cur_start = None
-    for t, v in zip(times, values):
-        cond_high = (hi is not None and v > hi)
-        cond_low  = (lo is not None and v < lo)
-        state = 'high' if cond_high else ('low' if cond_low else None)
-        if state != cur_state:
-            # 이전 구간 종료
-            if cur_state is not None and cur_start is not None:
-                out.append((cur_start, t, cur_state))
-            # 새 구간 시작
-            cur_state = state
-            cur_start = t if state is not None else None
-    # 마지막 구간 열려 있으면 닫기
-    if cur_state is not None and cur_start is not None:
-        out.append((cur_start, times[-1], cur_state))
-    # 정상(범위 내)만 있었다면 빈 리스트일 수 있음
-    return out
+    v = np.asarray(values, dtype=np.float64)
+    starts, ends, kinds = _find_transitions(
+        v, np.nan if lo is None else float(lo), np.nan if hi is None else float(hi)
+    )
+    # datetime 복원은 구간 경계 인덱스에 대해서만
+    return [
+        (times[s], times[e], 'high' if k > 0 else 'low')
+        for s, e, k in zip(starts.tolist(), ends.tolist(), kinds.tolist())
+    ]
+
+def out_of_range_hours(times, values, lo: Optional[float], hi: Optional[float]) -> float:
+    """이탈 구간 길이의 합(시간) — find_out_of_range_intervals()와 같은 구간을
+    (start, end) 튜플/Timestamp로 만들지 않고 경계 인덱스로 바로 합산"""
+    if len(times) == 0 or len(values) == 0 or (lo is None and hi is None):
+        return 0.0
+    starts, ends, _ = _find_transitions(
+        np.asarray(values, dtype=np.float64), np.nan if lo is None else float(lo), np.nan if hi is None else float(hi)
+    )
+    t = np.asarray(times, dtype="datetime64[ns]")
+    return float((t[ends] - t[starts]).sum() / np.timedelta64(1, "h"))
 
 def _resolve_room(device_id: str, room: str | None) -> str | None:
     if room:  # 호출 시 이미 넘겨준 경우
         return room
+    c = None
     try:
         c = get_db_connection()
         row = c.execute("SELECT room FROM devices WHERE device_id=?", (device_id,)).fetchone()
         return row["room"] if row and row["room"] else None
     except Exception:
         return None
+    finally:
+        if c is not None:
+            c.close()
+
+NUM_FIELDS = ["temperature","humidity","light_lux","soil_moisture","soil_temp","soil_ec","battery"]
+
+def _rows_to_frame(rows) -> pd.DataFrame:
+    """Influx 결과(DataFrame 또는 행 dict 목록)를 _time(UTC datetime64)/숫자 컬럼으로 한 번에 변환 (파싱 불가 값은 NaT/NaN)"""
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows or []))
+    df = df.reindex(columns=["_time", *NUM_FIELDS])
+    # _time 정규화는 이 함수 한 곳에서만 — parse_csv_frame()이 이미 UTC datetime64로 준 경우는 다시 파싱하지 않음
+    if not isinstance(df["_time"].dtype, pd.DatetimeTZDtype):
+        df["_time"] = pd.to_datetime(df["_time"], utc=True, errors="coerce", format="ISO8601")
+    # 숫자 변환은 문자열 등 아직 float이 아닌 컬럼만 (parse_csv_frame이 #datatype으로 이미 float64로 읽은 컬럼은 통과)
+    raw_cols = [c for c in NUM_FIELDS if not pd.api.types.is_float_dtype(df[c])]
+    if raw_cols:
+        df[raw_cols] = df[raw_cols].apply(pd.to_numeric, errors="coerce")
+    # 시간순 정렬은 여기서 1번만 (여러 테이블로 나뉘어 온 결과도 그래프/구간/최근값이 시간순이 되도록)
+    # 테이블 1개짜리 결과는 대부분 이미 시간순이므로 O(N) 확인 후 정렬 생략 (NaT가 있으면 정렬)
+    if df["_time"].is_monotonic_increasing:
+        return df.reset_index(drop=True)
+    return df.sort_values("_time", kind="stable", na_position="first", ignore_index=True)
+
+def _field_series(frame: pd.DataFrame, block: np.ndarray) -> dict:
+    """그래프용 필드별 (times, values) 배열: 시간/값 결측 행 제외, times는 UTC naive datetime64
+    block: frame[NUM_FIELDS]의 (행, 필드) float 배열 — 시간 변환은 1번만 하고 필드별로는 마스크만 적용"""
+    times = frame["_time"].dt.tz_convert(None).to_numpy()
+    has_time = ~np.isnat(times)
+    series = {}
+    for k, col in zip(NUM_FIELDS, block.T):
+        m = has_time & ~np.isnan(col)
+        series[k] = (times[m], col[m])
+    return series
+
+class MetricGrid(Flowable):
+    """지표 그래프 2열×N행 그리드 — 중첩 Table 대신 셀 좌표를 계산해 캔버스에 직접 그림.
+    cells: [(좌측 셀, 우측 셀), ...], 셀 = (제목, 그래프 PIL 이미지 또는 None, 캡션)"""
+    HEAD_H = 13
+    CAP_H  = 0.65*cm
+
+    def __init__(self, cells, col_w, img_h, gutter):
+        super().__init__()
+        self.cells, self.col_w, self.img_h, self.gutter = cells, col_w, img_h, gutter
+        self.hAlign = "CENTER"
+        self.cell_h = self.HEAD_H + img_h + self.CAP_H
+
+    def wrap(self, availWidth, availHeight):
+        self.width  = 2*self.col_w + self.gutter
+        self.height = len(self.cells) * self.cell_h
+        return self.width, self.height
+
+    def _fit(self, text, font, size):
+        """캡션 1줄 고정(넘치면 말줄임), 폰트 축소 금지"""
+        if pdfmetrics.stringWidth(text, font, size) <= self.col_w:
+            return text
+        while text and pdfmetrics.stringWidth(text + "…", font, size) > self.col_w:
+            text = text[:-1]
+        return text + "…"
+
+    def draw(self):
+        c = self.canv
+        for row, pair in enumerate(self.cells):
+            top = self.height - row * self.cell_h
+            for col, (label, img, caption) in enumerate(pair):
+                x = col * (self.col_w + self.gutter)
+                c.setFillColor(colors.black)
+                c.setFont(BASE_FONT, 10)
+                c.drawString(x, top - 10, label)
+                img_top = top - self.HEAD_H
+                if img is not None:
+                    c.drawImage(ImageReader(img), x, img_top - self.img_h, self.col_w, self.img_h,
+                                preserveAspectRatio=True, anchor="c", mask="auto")
+                c.setFillColor(colors.HexColor("#64748B"))
+                c.setFont(BASE_FONT, 9)
+                c.drawString(x, img_top - self.img_h - 9, self._fit(caption, BASE_FONT, 9))
+        # 이미지는 캔버스에 압축 스트림으로 들어갔으므로 원본 픽셀 버퍼는 바로 놓아준다 (빌드 나머지 구간의 메모리 절감)
+        self.cells = [tuple((label, None, caption) for label, _, caption in pair) for pair in self.cells]
+
+@functools.lru_cache(maxsize=4)
+def _load_logo(path: str):
+    """로고 PNG를 한 번만 읽어 (bytes, 폭pt, 높이pt) 반환 — 실패 시 None (리포트마다 재디코딩 방지)"""
+    try:
+        print(f"[DEBUG] LOGO_PATH={path} | cwd={os.getcwd()}")
+        with open(path, "rb") as _fh:
+            _bytes = _fh.read()
+        # 원본 픽셀 크기 → 비율 계산
+        iw_px, ih_px = ImageReader(io.BytesIO(_bytes)).getSize()  # 픽셀
+        max_w_pt = 4.2*cm                       # 원하는 폭 (pt)
+        scale = max_w_pt / float(iw_px)         # 비율
+        return _bytes, max_w_pt, float(ih_px) * scale
+    except Exception as _e:
+        print(f"[WARN] Logo load failed: {type(_e).__name__}: {_e} (path={path})")
+        return None
 
-def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, plant_type=None, room=None):
-    room = _resolve_room(device_id, room)
+def _normalize_device_id(device_id) -> str:
+    device_id = str(device_id)               # 어떤 타입이 와도 문자열화
+    # 과학적 표기처럼 변형된 케이스 방지: '2e+52' → '2e52'
+    if _RE_SCI_ID.fullmatch(device_id):
+        device_id = device_id.replace('E+','e').replace('e+','e')
+    return device_id
+
+# 리포트용 Flux 쿼리 템플릿 — 고정 부분(필드 필터/keep 컬럼)은 import 시 한 번만 만든다
+REPORT_FLUX_TEMPLATE = """
+    from(bucket: "{bucket}")
+    |> range(start: {start}, stop: {stop})
+    |> filter(fn: (r) => r["_measurement"] == "sensor_readings")
+    |> filter(fn: (r) => {dev_filter})
+    |> filter(fn: (r) => {field_filter})
+    |> aggregateWindow(every: {window}, fn: mean, createEmpty: false)
+    |> pivot(rowKey:["_time"], columnKey:["_field"], valueColumn:"_value")
+    |> keep(columns: ["_time","device_id",{keep}])
+    """
+# 그리는 숫자 필드만 (comment 같은 문자열 필드는 mean 집계 불가) — == / or 조합이라 스토리지로 푸시다운됨
+_FLUX_FIELD_FILTER = " or ".join(f'r["_field"] == "{f}"' for f in NUM_FIELDS)
+_FLUX_KEEP_COLUMNS = ",".join(f'"{f}"' for f in NUM_FIELDS)
+_RE_DEVICE_ID = re.compile(r"[A-Za-z0-9_\-]+")  # 'ge-sd-2e52', '2e52' 등 — 따옴표/연산자가 섞인 값은 쿼리에 넣지 않음
+
+def _valid_device_id(device_id: str) -> bool:
+    return bool(_RE_DEVICE_ID.fullmatch(device_id))
+
+def _report_query(device_ids, start_dt, end_dt) -> str:
+    """리포트용 Flux 쿼리 — 디바이스 1개면 ==, 여러 개면 contains(set:)로 한 번에 조회
+    device_id는 _normalize_device_id() 후 허용 문자만 통과 (아니면 ValueError)"""
+    ids = [_normalize_device_id(d) for d in device_ids]
+    bad = [d for d in ids if not _valid_device_id(d)]
+    if bad:
+        raise ValueError(f"invalid device_id for report query: {bad!r}")
+    if len(ids) == 1:
+        dev_filter = f'r["device_id"] == "{ids[0]}"'
+    else:
+        dev_filter = f'contains(value: r["device_id"], set: {json.dumps(ids)})'
+    return REPORT_FLUX_TEMPLATE.format(
+        bucket=INFLUXDB_BUCKET,
+        start=_fmt_iso_utc(start_dt),
+        stop=_fmt_iso_utc(end_dt),
+        dev_filter=dev_filter,
+        field_filter=_FLUX_FIELD_FILTER,
+        window=_report_window(start_dt, end_dt),
+        keep=_FLUX_KEEP_COLUMNS,
+    )
+
+_DURATION_SEC = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def _report_window(start_dt, end_dt) -> str:
+    """집계 구간: 기본은 REPORT_AGG_WINDOW(1h), 기간이 길어 행 수가 REPORT_MAX_ROWS를 넘으면 구간을 늘림
+    (주간 리포트는 604800s/300 ≈ 34분 < 1h 이므로 그대로 1h)"""
+    m = _RE_FLUX_DURATION.match(REPORT_AGG_WINDOW.strip())
+    if not m:
+        return REPORT_AGG_WINDOW
+    base = int(m.group(1)) * _DURATION_SEC[m.group(2)]
+    need = int((end_dt - start_dt).total_seconds()) // max(1, REPORT_MAX_ROWS)
+    return f"{need}s" if need > base else REPORT_AGG_WINDOW
+
+def fetch_report_rows(device_ids, start_dt, end_dt) -> dict:
+    """여러 디바이스의 기간 데이터를 쿼리 1회로 가져와 device_id별로 나눔.
+    반환: {device_id: DataFrame} — 데이터가 없는 디바이스도 빈 DataFrame으로 포함
+    쿼리 자체가 실패하면 RuntimeError (빈 결과와 구분)"""
+    ids = list(dict.fromkeys(_normalize_device_id(d) for d in device_ids if d))
+    bad = [d for d in ids if not _valid_device_id(d)]
+    if bad:
+        # 조회에서 빼면 해당 디바이스는 개별 생성 시 _report_query()에서 ValueError로 실패 처리됨
+        print(f"[WARN] skip invalid device_id in report query: {bad!r}")
+        ids = [d for d in ids if d not in bad]
+    if not ids:
+        return {}
+    df = query_influxdb_data_df(_report_query(ids, start_dt, end_dt))
+    if df is None:
+        # 조회 실패(HTTP/네트워크)를 "데이터 없음"으로 바꾸지 않음 → 호출 측이 디바이스별 개별 조회로 전환
+        raise RuntimeError(f"report rows query failed for {len(ids)} devices")
+    if "device_id" not in df.columns:
+        df = pd.DataFrame(columns=["_time", "device_id"])
+    # _time 정규화는 디바이스별 _rows_to_frame()에서만 (여기서는 나누기만 함)
+    groups = dict(tuple(df.groupby("device_id", sort=False)))
+    by_dev = {d: groups.get(d, df.iloc[0:0]) for d in ids}
+    print(f"[INFO] report rows fetched: devices={len(ids)}, rows={sum(len(v) for v in by_dev.values())}")
+    return by_dev
+
+# 배터리 상태 포맷터 (정수 퍼센트는 소수점 생략: 80.00% → 80%)
+def battery_status_string(level):
+    if level is None: return "데이터 없음"
+    if level >= 45:   status = "양호"
+    elif level >= 30: status = "낮음"
+    elif level >= 15: status = "매우 낮음"
+    else:             status = "위험"
+    return f"{status} ({level:.2f}%)".replace(".00%", "%")
+
+def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, plant_type=None, room=None, rows=None,
+                                  device_meta=None, to_file=None, standards_df=None):
+    """
+    디바이스 1대의 주간 PDF 보고서 생성.
+    기본은 메모리에서 만들어 (파일명, PDF bytes)를 반환하고,
+    to_file=True(또는 REPORT_PDF_TO_DISK=1)이면 임시 폴더에 저장 후 파일 경로를 반환한다. (디버그용)
+    standards_df: 배치에서 load_standards()를 한 번 호출해 넘기면 디바이스마다 다시 조회하지 않음
+    """
+    # device_meta: 호출 측이 이미 가진 devices 행(dict) — 있으면 DB 재조회 없이 사용
+    d = device_meta
+    # device_meta가 있으면 그 행의 room이 곧 DB 값 → 재조회하지 않음
+    room = room or ((d.get("room") or None) if d is not None else _resolve_room(device_id, None))
     
     plant_disp = plant_type
     room_disp  = room
     try:
         if _looks_mojibake(plant_disp) or not plant_disp:
-            d = get_device_by_device_id_any(device_id)
+            if d is None:
+                d = get_device_by_device_id_any(device_id)
             if d and d.get("plant_type"):
                 plant_disp = d["plant_type"]
         if _looks_mojibake(room_disp) or not room_disp:
-            if 'd' not in locals():
+            if d is None:
                 d = get_device_by_device_id_any(device_id)
             if d and d.get("room"):
                 room_disp = d["room"]
@@ -423,92 +931,41 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
         pass
     
     filename = f"greeneye_report_{_ascii_slug(device_id)}_{start_dt.strftime('%Y%m%d')}_{end_dt.strftime('%Y%m%d')}.pdf"
-    temp_dir = tempfile.gettempdir()
-    filepath = os.path.join(temp_dir, filename)
+    if to_file is None:
+        to_file = REPORT_PDF_TO_DISK
+    if to_file:
+        out = os.path.join(tempfile.gettempdir(), filename)
+    else:
+        out = io.BytesIO()
     doc = SimpleDocTemplate(
-        filepath,
+        out,
         pagesize=A4,
         leftMargin=5*mm, rightMargin=5*mm, topMargin=5*mm, bottomMargin=5*mm
     )
-    styles = getSampleStyleSheet()
+    styles = STYLES  # 모듈 로드 시 1번 만든 공유 스타일 (읽기 전용)
     story = []
 
-    # 스타일 정의/보정 (먼저 추가 → 이후 정렬 변경)
-    styles.add(ParagraphStyle(name='NotoTitle',    parent=styles['Title'],    fontName=BASE_FONT))
-    styles.add(ParagraphStyle(name='NotoNormal',   parent=styles['Normal'],   fontName=BASE_FONT))
-    styles.add(ParagraphStyle(name='NotoHeading4', parent=styles['Heading4'], fontName=BASE_FONT))
-    for st in styles.byName.values():
-        st.fontName = BASE_FONT
-    styles['NotoTitle'].alignment = 0  # 제목 왼쪽 정렬
-
-    # 우측 메타 스타일(작은 글자, 옅은 색, 오른쪽 정렬)
-    styles.add(ParagraphStyle(
-        name='MetaRight',
-        parent=styles['NotoNormal'],
-        alignment=2,  # RIGHT
-        fontSize=8.5,
-        textColor=colors.HexColor("#64748B"),
-        leading=11,
-        wordWrap='CJK'
-    ))
-
-    # 배터리 상태 포맷터
-    def battery_status_string(level):
-        if level is None: return "데이터 없음"
-        if level >= 45:  return f"양호 ({level:.2f}%)"
-        if level >= 30:  return f"낮음 ({level:.2f}%)"
-        if level >= 15:  return f"매우 낮음 ({level:.2f}%)"
-        return f"위험 ({level:.2f}%)"
-
     
     
     raw_device_id = device_id                # 디버그용 원본 보관
-    device_id = str(device_id)               # 어떤 타입이 와도 문자열화
-
-    # 과학적 표기처럼 변형된 케이스 방지: '2e+52' → '2e52'
-    if re.fullmatch(r'^[0-9]+e\+[0-9]+$', device_id, flags=re.I):
-        device_id = device_id.replace('E+','e').replace('e+','e')
+    device_id = _normalize_device_id(device_id)
 
     print(f"[DEBUG] device_id raw={raw_device_id!r} -> used={device_id!r}")
     
-    # Influx 쿼리
-    start = _fmt_iso_utc(start_dt)
-    end   = _fmt_iso_utc(end_dt)
-
-    did = json.dumps(device_id)  # -> 예: "2e52" 같은 정확한 문자열 리터럴 생성
-
-    query = f"""
-    from(bucket: "{INFLUXDB_BUCKET}")
-    |> range(start: {start}, stop: {end})
-    |> filter(fn: (r) => r["_measurement"] == "sensor_readings")
-    |> filter(fn: (r) => r["device_id"] == {did})
-    |> aggregateWindow(every: {REPORT_AGG_WINDOW}, fn: mean, createEmpty: false)
-    |> pivot(rowKey:["_time"], columnKey:["_field"], valueColumn:"_value")
-    |> keep(columns: ["_time","device_id","temperature","humidity","light_lux","soil_moisture","soil_temp","soil_ec","battery"])
-    """
-    rows = query_influxdb_data(query)
-
-    # 숫자/시간 정규화
-    def _to_float(v):
-        try: return float(v)
-        except: return None
-    for r in (rows or []):
-        for k in ["temperature","humidity","light_lux","soil_moisture","soil_temp","soil_ec","battery"]:
-            if r.get(k) is not None:
-                r[k] = _to_float(r[k])
-        if r.get("_time") is not None and not isinstance(r["_time"], datetime):
-            r["_time"] = datetime.fromisoformat(str(r["_time"]).replace("Z","+00:00"))
-
-    def pick(key): return [r.get(key) for r in rows if r.get(key) is not None]
-    def avg(values): return sum(v for v in values if v is not None)/len(values) if values else 0
-
-    # 최신 배터리/최근값
-    def last_value(key):
-        for r in sorted((rows or []), key=lambda x: x.get("_time") or datetime.min, reverse=True):
-            v = r.get(key)
-            if v is not None: return v
-        return None
-    latest_battery = last_value("battery")
+    # Influx 쿼리 (fetch_report_rows()로 미리 가져온 rows가 있으면 재사용)
+    if rows is None:
+        rows = query_influxdb_data_df(_report_query([device_id], start_dt, end_dt))
+    # 숫자/시간 정규화: 행 단위 float()/fromisoformat 대신 DataFrame 컬럼 단위로 한 번에 변환
+    frame = _rows_to_frame(rows)
+
+    # 필드별 값 배열/평균/최근값을 한 번에 계산 (이후 카드/그래프/요약에서 재사용)
+    block  = frame[NUM_FIELDS].to_numpy(dtype=float)  # (행, 필드) 2차원 배열로 한 번에 변환
+    valid  = {k: v[~np.isnan(v)] for k, v in zip(NUM_FIELDS, block.T)}
+    means  = {k: (float(v.mean()) if v.size else None) for k, v in valid.items()}
+    latest = {k: (float(v[-1]) if v.size else None) for k, v in valid.items()}  # frame은 이미 시간순
+    # 그래프/주간 평가용 (times, values) — 시간 결측 행까지 뺀 배열을 필드별로 한 번만 만든다
+    field_series = _field_series(frame, block)
+    latest_battery = latest["battery"]
 
     # ── 헤더: 좌(제목) + 우(메타 한 줄) ──────────────────────────────
     title_p = Paragraph(
@@ -528,51 +985,24 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
         f"기간: {_s_k} ~ {_e_k}",
         (f"식물: {_plant_label}" if _plant_label else None),
         f"위치: {_display_text(room_disp) or '(미설정)'}",
-        (f"배터리: {battery_status_string(latest_battery).replace('(%.2f' , '(%').replace('.00%', '%')}"
-         if isinstance(latest_battery, (int, float)) else f"배터리: {battery_status_string(latest_battery)}"),
+        f"배터리: {battery_status_string(latest_battery)}",
     ]
     meta_rows = [[Paragraph(line, styles['MetaRight'])] for line in meta_lines if line]
     right_nested = Table(meta_rows, colWidths=[8.2*cm], hAlign='RIGHT')
-    right_nested.setStyle(TableStyle([
-        ('ALIGN',         (0,0), (-1,-1), 'RIGHT'),
-        ('VALIGN',        (0,0), (-1,-1), 'TOP'),
-        ('LEFTPADDING',   (0,0), (-1,-1), 0),
-        ('RIGHTPADDING',  (0,0), (-1,-1), 0),
-        ('TOPPADDING',    (0,0), (-1,-1), 0),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 0),
-    ]))
+    right_nested.setStyle(_TS_META)
 
     # 좌측 셀: 로고(폭/높이 모두 지정해 안전하게) → 제목을 한 덩어리로
     _logo_img = None
-    try:
-        print(f"[DEBUG] LOGO_PATH={LOGO_PATH} | cwd={os.getcwd()}")
-        with open(LOGO_PATH, "rb") as _fh:
-            _bytes = _fh.read()
-        _bio = io.BytesIO(_bytes)
-        # 원본 픽셀 크기 → 비율 계산
-        ir = ImageReader(io.BytesIO(_bytes))
-        iw_px, ih_px = ir.getSize()             # 픽셀
-        max_w_pt = 4.2*cm                       # 원하는 폭 (pt)
-        scale = max_w_pt / float(iw_px)         # 비율
-        w_pt = max_w_pt
-        h_pt = float(ih_px) * scale
-        _bio.seek(0)
-        _logo_img = Image(_bio, width=w_pt, height=h_pt)  # kind 생략(직접 지정)
+    _logo = _load_logo(LOGO_PATH)
+    if _logo:
+        _bytes, w_pt, h_pt = _logo
+        _logo_img = Image(io.BytesIO(_bytes), width=w_pt, height=h_pt)  # kind 생략(직접 지정)
         _logo_img.hAlign = "LEFT"
-    except Exception as _e:
-        print(f"[WARN] Logo load failed: {type(_e).__name__}: {_e} (path={LOGO_PATH})")
 
     # 좌측 셀 구성: 로고가 있으면 2행짜리 중첩 테이블(로고 / 제목), 없으면 제목만
     if _logo_img:
         left_nested = Table([[ _logo_img ], [ title_p ]], colWidths=[11.8*cm])
-        left_nested.setStyle(TableStyle([
-            ('ALIGN',        (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN',       (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING',  (0,0), (-1,-1), 0),
-            ('RIGHTPADDING', (0,0), (-1,-1), 0),
-            ('TOPPADDING',   (0,0), (-1,-1), 0),
-            ('BOTTOMPADDING',(0,0), (-1,-1), 0),
-        ]))
+        left_nested.setStyle(_TS_HEADER_LEFT)
         left_cell = left_nested
     else:
         left_cell = title_p
@@ -587,65 +1017,30 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
     header = Table([[left_cell, right_nested]],
                    colWidths=[header_left_w, header_right_w],
                    hAlign='CENTER')
-    header.setStyle(TableStyle([
-        ('VALIGN',        (0,0), (-1,-1), 'TOP'),
-        ('ALIGN',         (0,0), (0,0),   'LEFT'),
-        ('ALIGN',         (1,0), (1,0),   'RIGHT'),
-        ('LEFTPADDING',   (0,0), (-1,-1), 0),
-        ('RIGHTPADDING',  (0,0), (-1,-1), 0),
-        ('TOPPADDING',    (0,0), (-1,-1), 0),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 2),
-        ('LINEBELOW',     (0,0), (-1,0), 0.8, colors.HexColor("#E5E7EB")),
-        # ▶ 우측 셀만 바닥 정렬 & 패딩 살짝 축소해 룰과 더 가까이
-        ('VALIGN',        (1,0), (1,0), 'BOTTOM'),
-        ('BOTTOMPADDING', (1,0), (1,0), 1),
-    ]))
+    header.setStyle(_TS_HEADER)
     story.append(header)
     story.append(Spacer(1, 0.2*cm))
 
     # 데이터가 없을 때도 헤더는 보이도록, 여기서 처리
-    if not rows:
+    if frame.empty:
         story.append(Paragraph("이 기간 동안의 센서 데이터를 가져올 수 없거나, 데이터가 없습니다.", styles['NotoNormal']))
         doc.build(story)
-        return filepath
+        return out if to_file else (filename, out.getvalue())
 
     # 평균/최근값 표
     story.append(Paragraph("센서 요약 (평균값 & 최근값)", styles['NotoHeading4']))
     def fmt(v): return "N/A" if v is None else f"{float(v):.1f}"
-    last = {
-        "temperature":   last_value("temperature"),
-        "humidity":      last_value("humidity"),
-        "light_lux":     last_value("light_lux"),
-        "soil_temp":     last_value("soil_temp"),
-        "soil_moisture": last_value("soil_moisture"),
-        "soil_ec":       last_value("soil_ec"),
-    }
 
     # ── 카드 레이아웃 helpers ──────────────────────────────────────
-    def _avg_of(key): 
-        vals = [v for v in pick(key) if v is not None]
-        return (sum(vals)/len(vals)) if vals else None
     def _range_text(lo, hi):
         lo_s = "-" if lo is None else f"{lo:.0f}"
         hi_s = "-" if hi is None else f"{hi:.0f}"
         return f"정상범위:<br/>{lo_s}–{hi_s}"
     def _chip(text, warn=False):
         # 칩(최근값) 배경/테두리
-        bg = colors.HexColor("#F1F5F9") if not warn else colors.HexColor("#FDECEC")
-        fg = colors.HexColor("#0F172A") if not warn else colors.HexColor("#B91C1C")
-        t = Table([[Paragraph(text, ParagraphStyle(name="chip", parent=styles['NotoNormal'],
-                                                   fontSize=10, textColor=fg))]],
+        t = Table([[Paragraph(text, styles['ChipWarn' if warn else 'Chip'])]],
                   colWidths=[None])
-        t.setStyle(TableStyle([
-            ('LEFTPADDING', (0,0), (-1,-1), 4),
-            ('RIGHTPADDING',(0,0), (-1,-1), 4),
-            ('TOPPADDING',  (0,0), (-1,-1), 2),
-            ('BOTTOMPADDING',(0,0),(-1,-1), 2),
-            ('BACKGROUND',  (0,0), (-1,-1), bg),
-            ('BOX',         (0,0), (-1,-1), 0.3, colors.HexColor("#E2E8F0")),
-            ('ROUNDRECT',   (0,0), (-1,-1), 2, 2),
-            ('ALIGN',       (0,0), (-1,-1), 'LEFT'),
-        ]))
+        t.setStyle(_TS_CHIP[bool(warn)])
         return t
     
     # 숫자 + 단위를 한 줄로(줄바꿈 금지) 묶어주는 헬퍼
@@ -655,25 +1050,13 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
         # 숫자와 단위 사이를 non-breaking space로, 전체를 <nobr>로 감싼다
         return f"<nobr>{num_str}&nbsp;{unit_disp}</nobr>"
     
-    styles.add(ParagraphStyle(
-        name='CardTitle', parent=styles['NotoNormal'],
-        fontSize=10.5, leading=13, spaceAfter=1
-    ))
-    styles.add(ParagraphStyle(
-        name='CardMeta', parent=styles['NotoNormal'],
-        fontSize=9.5, leading=12
-    ))
-    styles.add(ParagraphStyle(
-        name='CardRange', parent=styles['NotoNormal'],
-        fontSize=8.5, leading=11, textColor=colors.HexColor("#64748B")
-    ))
-    
     def _shrink(html: str, width: float, height: float, style):
         p = Paragraph(html, style)
         return KeepInFrame(width, height, [p], mode="shrink", hAlign="LEFT", vAlign="TOP")
     
-    # 표준범위(카드 경고판단에 사용) - 아래에서 standards_df 재사용됨
-    standards_df = load_standards() if 'standards_df' not in locals() else standards_df
+    # 표준범위(카드 경고판단에 사용) - 아래 그래프/요약에서도 재사용됨 (캐시된 DataFrame)
+    if standards_df is None:
+        standards_df = load_standards()
 
     # 카드 데이터 정의(순서 유지)
     CARD_ITEMS = [
@@ -692,8 +1075,8 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
 
     card_cells = []
     for label, key, unit, std_key in CARD_ITEMS:
-        a = _avg_of(key)
-        l = last.get(key)
+        a = means.get(key)
+        l = latest.get(key)
         lo, hi = get_range(standards_df, plant_type, std_key)
         warn = False
         if isinstance(l, (int, float)):
@@ -726,37 +1109,21 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
              [range_p]],
             colWidths=[card_w]
         )
-        content.setStyle(TableStyle([
-            ('ALIGN',        (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN',       (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING',  (0,0), (-1,-1), 6),
-            ('RIGHTPADDING', (0,0), (-1,-1), 6),
-            ('TOPPADDING',   (0,0), (-1,-1), 5),
-            ('BOTTOMPADDING',(0,0), (-1,-1), 5),
-        ]))
+        content.setStyle(_TS_CARD_CONTENT)
 
         # 고정 높이 대신 "최소 높이"로 설정 → 오버플로우 방지
         card_box = Table([[content]], colWidths=[card_w])
         # 기본 테두리 색(중립): 연회색
-        border_color = colors.HexColor("#CBD5E1")     # gray-300
+        border_color = "#CBD5E1"     # gray-300
         # 값이 정상 범위를 벗어나면 ‘부드러운 파스텔’로만 강조
         if l is not None:
             if lo is not None and l < lo:
-                border_color = colors.HexColor("#93C5FD")
+                border_color = "#93C5FD"
             elif hi is not None and l > hi:
-                border_color = colors.HexColor("#FCA5A5")
+                border_color = "#FCA5A5"
             # 만약 "토양 전도도"처럼 특정 항목에 초록 강조를 쓰고 싶다면 여기서 분기 가능
 
-        card_box.setStyle(TableStyle([
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING', (0,0), (-1,-1), 0),
-            ('RIGHTPADDING', (0,0), (-1,-1), 0),
-            ('TOPPADDING', (0,0), (-1,-1), 0),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 0),
-            ('BACKGROUND', (0,0), (-1,-1), colors.white),
-            ('BOX', (0,0), (-1,-1), 0.6, border_color),
-        ]))
+        card_box.setStyle(_card_box_style(border_color))
         card_cells.append([card_box])
 
     # 6개 카드를 가터 포함 가로 1줄로 배치
@@ -771,26 +1138,10 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
         if i < 5:
             row.append('')
     cards_row = Table([row], colWidths=cols, hAlign='CENTER')
-    cards_row.setStyle(TableStyle([
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('LEFTPADDING', (0,0), (-1,-1), 0),
-        ('RIGHTPADDING', (0,0), (-1,-1), 0),
-        ('TOPPADDING', (0,0), (-1,-1), 0),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 0),
-    ]))
+    cards_row.setStyle(_TS_CARDS_ROW)
     story.append(cards_row)
     story.append(Spacer(1, 0.5*cm))
 
-    # 표준범위 로딩
-    standards_df = load_standards()
-    # 로딩 실패 시 한 번 더 시도(엔진 문제 등)
-    if standards_df is None:
-        try:
-            standards_df = pd.read_excel(STANDARDS_PATH, engine="openpyxl")
-        except Exception as e:
-            print(f"[WARN] standards second try failed: {e}")
-    
-    
     # ── 2열 레이아웃: 좌(환경 온도/습도/조도), 우(토양 온도/수분/전도도) ──
     left_fields  = [
         ("temperature","온도 (°C)"),
@@ -806,103 +1157,52 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
     col_w = 9.3*cm
     img_h = 4.05*cm 
 
+    # 그래프 6개는 스레드 풀에서 병렬 렌더링 (PNG 인코딩 중 GIL 해제)
+    metric_fields = [f for pair in zip(left_fields, right_fields) for f in pair]
+    metric_ranges = {field: get_range(standards_df, plant_type, field) for field, _ in metric_fields}
+    graph_tasks = [(*field_series[field], field, label, *metric_ranges[field])
+                   for field, label in metric_fields]
+    graph_imgs = dict(zip((f for f, _ in metric_fields), _graph_pool().map(_render_one_graph, graph_tasks)))
+
     def build_metric_block(field, label):
-        # 값 목록만 추출 (요약 계산용)
-        v_list = []
-        for r in rows:
-            v = r.get(field)
-            if v is not None:
-                v_list.append(_to_float(v))
         # 정상 범위
-        lo, hi = get_range(standards_df, plant_type, field)
+        lo, hi = metric_ranges[field]
         # 그래프 이미지
-        img_buf = generate_graph_image(rows, field, label, lo=lo, hi=hi)
-        # 구성 파트(1열 N행)
-        parts = [[Paragraph(label, styles['NotoHeading4'])]]
-        if img_buf:
-            parts.append([Image(img_buf, width=col_w, height=img_h)])
+        img = graph_imgs[field]
         # 요약 텍스트
-        import math as _math
-        vals = [float(x) for x in v_list if x is not None and not (_math.isnan(x) if isinstance(x, float) else False)]
-        def _cap(text):
-            # 캡션 1줄 고정(넘치면 말줄임), 폰트 축소 금지
-            html = f"<font size=9 color='#64748B'>{text}</font>"
-            p = Paragraph(html, styles['NotoNormal'])
-            return KeepInFrame(col_w, 0.65*cm, [p], mode='truncate', hAlign='CENTER', vAlign='TOP')
-
+        vals = valid[field]
         if lo is None and hi is None:
-            parts.append([_cap("정상 범위를 찾을 수 없어 이탈 횟수 집계 불가")])
+            caption = "정상 범위를 찾을 수 없어 이탈 횟수 집계 불가"
         else:
-            low_cnt  = sum(1 for x in vals if lo is not None and x <  lo)
-            high_cnt = sum(1 for x in vals if hi is not None and x >  hi)
+            low_cnt  = int((vals < lo).sum()) if lo is not None else 0
+            high_cnt = int((vals > hi).sum()) if hi is not None else 0
             total_cnt = low_cnt + high_cnt
-            summary_txt = f"정상 범위 이탈 횟수: 낮음 {low_cnt}회, 높음 {high_cnt}회 (총 {total_cnt}회)"
-            parts.append([_cap(summary_txt)])
-            
-        # 칸 안 여백
-        parts.append([Spacer(1, 0.25*cm)])
-        t = Table(parts, colWidths=[col_w])
-        t.setStyle(TableStyle([
-            ('ALIGN',        (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN',       (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING',  (0,0), (-1,-1), 0),
-            ('RIGHTPADDING', (0,0), (-1,-1), 0),
-            ('TOPPADDING',   (0,0), (-1,-1), 0),
-            ('BOTTOMPADDING',(0,0), (-1,-1), 0),
-        ]))
-        return t
-
-    # 좌/우 컬럼 구성
-    left_column  = Table([[build_metric_block(f,l)] for f,l in left_fields],  colWidths=[col_w])
-    right_column = Table([[build_metric_block(f,l)] for f,l in right_fields], colWidths=[col_w])
-    for col in (left_column, right_column):
-        col.setStyle(TableStyle([
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING', (0,0), (-1,-1), 0),
-            ('RIGHTPADDING', (0,0), (-1,-1), 0),
-            ('TOPPADDING', (0,0), (-1,-1), 0),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 0),
-        ]))
-
-    # 두 컬럼 + 중간 가터 → 중앙 정렬
-    grid = Table(
-        [[left_column, '', right_column]],
-        colWidths=[col_w, 0.8*cm, col_w],
-        hAlign='CENTER'
-    )
-    grid.setStyle(TableStyle([
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('LEFTPADDING', (0,0), (-1,-1), 0),
-        ('RIGHTPADDING', (0,0), (-1,-1), 0),
-        ('TOPPADDING', (0,0), (-1,-1), 0),
-        ('BOTTOMPADDING', (0,0), (-1,-1), 0),
-    ]))
-    story.append(grid)
+            caption = f"정상 범위 이탈 횟수: 낮음 {low_cnt}회, 높음 {high_cnt}회 (총 {total_cnt}회)"
+        return (label, img, caption)
+
+    # 좌/우 컬럼 구성 → 고정 좌표 2×3 그리드로 직접 그림
+    cells = [(build_metric_block(lf, ll), build_metric_block(rf, rl))
+             for (lf, ll), (rf, rl) in zip(left_fields, right_fields)]
+    story.append(MetricGrid(cells, col_w, img_h, gutter=0.8*cm))
+    graph_imgs.clear()  # 이미지 참조는 MetricGrid만 갖도록 (그린 뒤 해제)
     
     # ── AI 한줄 코멘트 & 관리 팁 ──────────────────────────────
-    styles.add(ParagraphStyle(name='AiBoxTitle',
-        parent=styles['NotoHeading4'], fontSize=11, leading=13))
-    styles.add(ParagraphStyle(name='AiBoxText',
-        parent=styles['NotoNormal'], fontSize=9.3, leading=11))
-
     story.append(Spacer(1, 0.3*cm))
 
     # 주간 평가용 시계열/요약 헬퍼
-    def _wk_seq(rows, k):
-        return [(r["_time"], float(r[k])) for r in (rows or []) if r.get("_time") and r.get(k) is not None]
+    def _wk_seq(k):
+        return field_series[k]
     def _wk_eval(seq, lo, hi):
-        vals  = [v for _, v in seq]
-        times = [t for t, _ in seq]
+        times, vals = seq
         total = len(vals)
         if total == 0:
            return {"total":0,"rate_in":0.0,"low":0,"high":0,"hours":0.0,"dom":"in"}
-        in_mask = [((lo is None or v >= lo) and (hi is None or v <= hi)) for v in vals]
-        in_cnt  = sum(in_mask)
-        low_cnt  = sum(1 for v in vals if lo is not None and v < lo)
-        high_cnt = sum(1 for v in vals if hi is not None and v > hi)
-        iv = find_out_of_range_intervals(times, vals, lo, hi) or []
-        hours = sum((b-a).total_seconds() for a,b,_ in iv) / 3600.0
+        low_mask  = (vals < lo) if lo is not None else np.zeros(total, dtype=bool)
+        high_mask = (vals > hi) if hi is not None else np.zeros(total, dtype=bool)
+        low_cnt  = int(low_mask.sum())
+        high_cnt = int(high_mask.sum())
+        in_cnt   = int((~(low_mask | high_mask)).sum())
+        hours = out_of_range_hours(times, vals, lo, hi)
         # 우세(high/low) 판정 (약간의 여유 폭)
         if high_cnt > max(3, low_cnt * 1.2):
             dom = "high"
@@ -913,8 +1213,8 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
         return {"total":total,"rate_in":in_cnt/total,"low":low_cnt,"high":high_cnt,"hours":hours,"dom":dom}
 
     def _compose_line(label, key, std_key):
-        seq = _wk_seq(rows, key)
-        if not seq:
+        seq = _wk_seq(key)
+        if not len(seq[1]):
             return f"<b>{label}</b>: 이번 주 데이터가 없었어요."
         lo, hi = get_range(standards_df, plant_type, std_key)
         if lo is None and hi is None:
@@ -995,13 +1295,7 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
         ai_title = Paragraph("이번 주 요약 & 다음 주 관리 Tip", styles['AiBoxTitle'])
         # 타이틀 아래 얇은 구분선
         title_rule = Table([[ai_title]], colWidths=[doc.width-12*mm])
-        title_rule.setStyle(TableStyle([
-            ('LINEBELOW', (0,0), (-1,-1), 0.5, colors.HexColor("#E5E7EB")),
-            ('LEFTPADDING', (0,0), (-1,-1), 0),
-            ('RIGHTPADDING',(0,0), (-1,-1), 0),
-            ('TOPPADDING',  (0,0), (-1,-1), 0),
-            ('BOTTOMPADDING',(0,0),(-1,-1), 6),
-        ]))
+        title_rule.setStyle(_TS_AI_TITLE_RULE)
 
         # 요약 목록을 2열(3개/3개) 테이블로 구성해 높이 절감
         left_items  = ai_lines[0::2]
@@ -1017,14 +1311,7 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
         gutter = 6*mm
         colw = (inner_width - gutter) / 2.0
         lines_2col = Table(two_col_rows, colWidths=[colw, colw], hAlign="LEFT")
-        lines_2col.setStyle(TableStyle([
-            ('VALIGN', (0,0), (-1,-1), 'TOP'),
-            ('LEFTPADDING', (0,0), (-1,-1), 0),
-            ('RIGHTPADDING',(0,0), (-1,-1), 0),
-            ('TOPPADDING',  (0,0), (-1,-1), 1),
-            ('BOTTOMPADDING',(0,0), (-1,-1), 1),
-            # 칼럼 사이 가터를 넣기 위해 빈 컬럼 대신 내부 오른쪽 패딩만 살짝
-        ]))
+        lines_2col.setStyle(_TS_AI_LINES)
 
         inner = KeepInFrame(
             maxWidth=doc.width-12*mm,
@@ -1034,22 +1321,137 @@ def generate_pdf_report_by_device(device_id, start_dt, end_dt, friendly_name, pl
             hAlign="LEFT", vAlign="TOP"
         )
         ai_box = Table([[inner]], colWidths=[doc.width], hAlign="CENTER")
-        ai_box.setStyle(TableStyle([
-            ('LEFTPADDING',   (0,0), (-1,-1), 4),
-            ('RIGHTPADDING',  (0,0), (-1,-1), 4),
-            ('TOPPADDING',    (0,0), (-1,-1), 5),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 5),
-            ('BOX',           (0,0), (-1,-1), 0.7, colors.HexColor("#CBD5E1")),
-            ('BACKGROUND',    (0,0), (-1,-1), colors.white),
-        ]))
+        ai_box.setStyle(_TS_AI_BOX)
         story.append(ai_box)
         story.append(Spacer(1, 0.2*cm))
 
     # PDF 저장
     doc.build(story)
-    return filepath
-
-def send_email_with_pdf(to_email, subject, body_text, pdf_path):
+    return out if to_file else (filename, out.getvalue())
+
+def _smtp_connect():
+    server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=20)
+    server.ehlo(); server.starttls(); server.ehlo()
+    server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
+    return server
+
+SMTP_IDLE_CHECK_SEC = 30  # 마지막 전송 후 이 시간 이상 지났으면 NOOP으로 연결 상태 확인
+SMTP_WORKERS = int(os.getenv("SMTP_WORKERS", "2"))  # 동시 발송 세션 수 (서버 동시 로그인 제한 고려해 2~4 권장)
+
+class _SmtpSession:
+    """배치용 SMTP 연결 래퍼: 오래 쉬었으면 NOOP으로 확인하고,
+    서버가 연결을 끊었으면 다시 로그인해 한 번 더 보낸다."""
+    def __init__(self):
+        self.server = _smtp_connect()
+        self.last = time.monotonic()
+
+    def _reconnect(self):
+        self.close()
+        self.server = _smtp_connect()
+
+    def send(self, msg):
+        if time.monotonic() - self.last > SMTP_IDLE_CHECK_SEC:
+            try:
+                ok = self.server.noop()[0] == 250
+            except smtplib.SMTPException:
+                ok = False
+            if not ok:
+                self._reconnect()
+        try:
+            self.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            print("[WARN] SMTP 연결 끊김, 재연결 후 재전송")
+            self._reconnect()
+            self.server.send_message(msg)
+        self.last = time.monotonic()
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            pass
+
+@contextlib.contextmanager
+def smtp_session():
+    """발송 배치 전체에서 SMTP 연결(STARTTLS+로그인) 1개를 재사용.
+    연결 실패/계정 미설정 시 None을 넘겨 각 send_*가 개별 연결로 처리하게 함"""
+    session = None
+    if EMAIL_USERNAME:
+        try:
+            session = _SmtpSession()
+        except Exception as e:
+            print(f"[WARN] SMTP session open failed, fallback to per-mail connection: {e}")
+    try:
+        yield session
+    finally:
+        if session is not None:
+            session.close()
+
+def _smtp_send(msg, server=None):
+    """server(smtp_session 또는 smtplib.SMTP)가 있으면 재사용, 없으면 이번 메일만 새 연결로 전송"""
+    if isinstance(server, _SmtpSession):
+        server.send(msg)
+        return
+    if server is not None:
+        server.send_message(msg)  # 헤더/인코딩 자동 처리
+        return
+    with _smtp_connect() as own:
+        own.send_message(msg)
+
+def _pdf_part(pdf):
+    """
+    첨부 파트 생성. pdf: (파일명, bytes), 파일 경로 또는 _pdf_parts()로 미리 만든 파트(그대로 사용)
+    파일은 mmap으로 매핑해 바로 base64 인코딩 (f.read()로 파일 전체를 한 번 더 복사하지 않음)
+    """
+    if isinstance(pdf, MIMEApplication):
+        return pdf
+    if isinstance(pdf, tuple):
+        name, data = pdf
+        part = MIMEApplication(data, _subtype="pdf")
+    else:
+        name = os.path.basename(pdf)
+        with open(pdf, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                part = MIMEApplication(b"", _subtype="pdf")  # 빈 파일은 mmap 불가
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    # MIMEApplication이 생성 시점에 base64 문자열로 인코딩하므로 이후 매핑을 닫아도 됨
+                    part = MIMEApplication(mm, _subtype="pdf")
+    # 첨부파일 이름 인코딩(한글 파일명 대비)
+    part.add_header("Content-Disposition", "attachment", filename=(Header(name, "utf-8").encode()))
+    return part
+
+def _pdf_parts(pdfs: dict) -> dict:
+    """{key: PDF} → {key: 첨부 파트}. 여러 수신자에게 가는 같은 PDF는 base64 인코딩을 1번만 함
+    (파트는 발송 시 읽기만 하므로 여러 메일/스레드에서 공유해도 됨, 실패한 항목은 None)"""
+    parts = {}
+    for key, pdf in pdfs.items():
+        if not pdf:
+            parts[key] = None
+            continue
+        try:
+            parts[key] = _pdf_part(pdf)
+        except Exception as e:
+            print(f"[WARN] attach failed: {key} ({e})")
+            parts[key] = None
+    return parts
+
+def _send_batch(sends: list):
+    """sends: [(send_email_with_pdf(s), args), ...]
+    SMTP_WORKERS개 스레드가 각자 smtp_session 1개씩 열어 나눠 보냄 (SMTP 전송은 네트워크 대기 위주)"""
+    def run(part):
+        with smtp_session() as server:
+            for fn, args in part:
+                fn(*args, server=server)
+
+    workers = max(1, min(SMTP_WORKERS, len(sends)))
+    if workers == 1:
+        run(sends)
+        return
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="smtp") as ex:
+        list(ex.map(run, [sends[i::workers] for i in range(workers)]))
+
+def send_email_with_pdf(to_email, subject, body_text, pdf_path, server=None):
     msg = MIMEMultipart()
     if not EMAIL_USERNAME:
         print("[WARN] EMAIL_USERNAME not set. Skipping email send; PDF only.")
@@ -1059,19 +1461,10 @@ def send_email_with_pdf(to_email, subject, body_text, pdf_path):
     msg["Subject"] = Header(subject, "utf-8")  # 한글 제목 안전
     msg.attach(MIMEText(body_text, "plain", _charset="utf-8"))  # 본문 인코딩 명시
 
-    with open(pdf_path, "rb") as f:
-        part = MIMEApplication(f.read(), _subtype="pdf")
-        # 첨부파일 이름 인코딩(한글 파일명 대비)
-        part.add_header('Content-Disposition', 'attachment', filename=(Header(os.path.basename(pdf_path), 'utf-8').encode()))
-        msg.attach(part)
+    msg.attach(_pdf_part(pdf_path))
 
     try:
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=20) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.send_message(msg)  # 헤더/인코딩 자동 처리
+        _smtp_send(msg, server)
         print(f"PDF 보고서 전송 성공: {to_email}")
         return True
     except Exception as e:
@@ -1079,7 +1472,8 @@ def send_email_with_pdf(to_email, subject, body_text, pdf_path):
         return False
 
 # 계정이 하나일 때, PDF를 한 통으로 묶어 전송
-def send_email_with_pdfs(to_email: str, subject: str, body_text: str, pdf_paths: list[str]) -> bool:
+def send_email_with_pdfs(to_email: str, subject: str, body_text: str, pdf_paths: list, server=None) -> bool:
+    """pdf_paths: 파일 경로 또는 generate_pdf_report_by_device()의 (파일명, bytes) 목록"""
     msg = MIMEMultipart()
     if not EMAIL_USERNAME:
         print("[WARN] EMAIL_USERNAME not set. Skipping email send; PDFs only.")
@@ -1092,17 +1486,10 @@ def send_email_with_pdfs(to_email: str, subject: str, body_text: str, pdf_paths:
     attached = 0
     for p in pdf_paths:
         try:
-            if not p or not os.path.exists(p):
+            if not p or (isinstance(p, str) and not os.path.exists(p)):
                 print(f"[WARN] skip attach (not found): {p}")
                 continue
-            with open(p, "rb") as f:
-                part = MIMEApplication(f.read(), _subtype="pdf")
-            part.add_header(
-                "Content-Disposition",
-                "attachment",
-                filename=(Header(os.path.basename(p), "utf-8").encode()),
-            )
-            msg.attach(part)
+            msg.attach(_pdf_part(p))
             attached += 1
         except Exception as e:
             print(f"[WARN] attach failed: {p} ({e})")
@@ -1112,16 +1499,98 @@ def send_email_with_pdfs(to_email: str, subject: str, body_text: str, pdf_paths:
         return False
 
     try:
-        with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT, timeout=20) as server:
-            server.ehlo(); server.starttls(); server.ehlo()
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.send_message(msg)
+        _smtp_send(msg, server)
         print(f"[OK] bundled mail sent to {to_email} with {attached} attachments")
         return True
     except Exception as e:
         print(f"[ERR] bundled email send failed: {e}")
         return False
 
+# 프로세스 풀은 CLI(python -m backend_app.report_generator)에서만 사용 (__main__에서 켬).
+# 앱(gunicorn 워커 + BackgroundScheduler)에는 paho 루프/이미지·추론 executor/Influx 배치 스레드가
+# 돌고 있어 fork하면 잠긴 락까지 복제돼 교착·메모리 폭증 위험 → 스레드 경로로 생성
+_process_pool_enabled = False
+
+def _report_process_pool(n_jobs: int) -> Optional[ProcessPoolExecutor]:
+    """PDF 생성용 프로세스 풀 (CLI 실행이 아니거나, 작업이 1개뿐이거나 REPORT_WORKERS<=1이면 None)"""
+    if not _process_pool_enabled:
+        return None
+    workers = min(REPORT_WORKERS, n_jobs)
+    if workers <= 1:
+        return None
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except Exception as e:
+        print(f"[WARN] 프로세스 풀 사용 불가, 스레드 처리로 전환: {e}")
+        return None
+
+def _render_reports(jobs: dict, pool: Optional[ProcessPoolExecutor] = None) -> dict:
+    """jobs: {key: (args, kwargs)} → {key: (파일명, PDF bytes) 또는 filepath}
+    디바이스별 PDF 생성은 서로 독립적이므로 프로세스 풀로 병렬 처리 (실패한 항목은 None)
+    pool을 넘기면 그 풀을 쓰고(종료는 호출자 몫), 없으면 이번 호출용 풀을 만들어 쓴 뒤 닫는다."""
+    results = {}
+    own_pool = pool is None
+    if own_pool:
+        pool = _report_process_pool(len(jobs))
+    if pool is not None:
+        try:
+            futs = {pool.submit(generate_pdf_report_by_device, *a, **kw): k for k, (a, kw) in jobs.items()}
+            for fut in as_completed(futs):
+                key = futs[fut]
+                try:
+                    results[key] = fut.result()
+                except Exception as e:
+                    print(f"[WARN] PDF 생성 실패 ({key}): {e}")
+                    results[key] = None
+        except Exception as e:
+            print(f"[WARN] 프로세스 풀 사용 불가, 스레드 처리로 전환: {e}")
+        finally:
+            if own_pool:
+                pool.shutdown()
+    # 남은 작업(단일 코어/프로세스 풀 불가)은 스레드로 — Agg 렌더링/zlib 압축 구간은 GIL을 놓으므로 겹쳐서 실행됨
+    rest = [k for k in jobs if k not in results]
+    if rest:
+        with ThreadPoolExecutor(max_workers=max(1, min(REPORT_THREADS, len(rest)))) as ex:
+            futs = {ex.submit(generate_pdf_report_by_device, *jobs[k][0], **jobs[k][1]): k for k in rest}
+            for fut in as_completed(futs):
+                key = futs[fut]
+                try:
+                    results[key] = fut.result()
+                except Exception as e:
+                    print(f"[WARN] PDF 생성 실패 ({key}): {e}")
+                    results[key] = None
+    return results
+
+def _render_reports_pipelined(jobs: dict, start_dt, end_dt) -> dict:
+    """_render_reports()와 같지만 rows를 REPORT_FETCH_CHUNK개 디바이스씩 나눠 조회하면서
+    다음 묶음의 Influx 조회(네트워크 대기)를 현재 묶음의 PDF 생성(CPU)과 겹쳐 실행.
+    조회에 실패한 묶음은 rows=None으로 넘겨 디바이스별 개별 조회로 처리됨.
+    프로세스 풀은 전체 묶음에 1개만 띄워 재사용 (워커의 그래프 Figure/스레드 풀도 묶음 간에 유지됨)"""
+    keys = list(jobs)
+    chunks = [keys[i:i + REPORT_FETCH_CHUNK] for i in range(0, len(keys), max(1, REPORT_FETCH_CHUNK))]
+    results = {}
+    pool = _report_process_pool(len(keys))
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-fetch") as fetcher:
+            nxt = fetcher.submit(fetch_report_rows, chunks[0], start_dt, end_dt) if chunks else None
+            for i, chunk in enumerate(chunks):
+                try:
+                    rows_by_dev = nxt.result()
+                except Exception as e:
+                    print(f"[WARN] report rows fetch failed, fallback to per-device query: {e}")
+                    rows_by_dev = {}
+                # 다음 묶음 조회를 먼저 걸어두고 현재 묶음 렌더링
+                nxt = fetcher.submit(fetch_report_rows, chunks[i + 1], start_dt, end_dt) if i + 1 < len(chunks) else None
+                part = {}
+                for k in chunk:
+                    args, kw = jobs[k]
+                    part[k] = (args, {**kw, "rows": rows_by_dev.get(k)})
+                results.update(_render_reports(part, pool))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
 def send_all_reports():
     print(f"\n--- PDF 보고서 전송 시작: {datetime.now()} ---")
     users = get_all_users()
@@ -1129,7 +1598,9 @@ def send_all_reports():
     now = datetime.now().astimezone(pytz.utc)  # 로컬시간 -> UTC로 변환
     # 주간 리포트
     start = now - timedelta(days=7)
+    load_standards()  # 배치 전체에서 1회 (렌더링 워커는 fork 시 캐시를 물려받음)
 
+    recipients = []
     for user in users:
         # 동의하지 않은 사용자는 스킵
         if not _has_email_consent(user):
@@ -1139,21 +1610,47 @@ def send_all_reports():
                 _email_dbg = None
             print(f"[INFO] skip user={_email_dbg}: email_consent=0")
             continue
-        email = user["email"]
+        recipients.append(user["email"])
+    if not recipients:
+        print(f"--- PDF 보고서 전송 완료 (수신자 없음) ---\n")
+        return
+
+    # 같은 기간의 디바이스 PDF는 받는 사람과 무관하게 동일 → 디바이스당 1번만 생성해 모든 수신자에게 재사용
+    jobs = {}
+    for device in devices:
+        key = _normalize_device_id(device["device_id"])
+        jobs.setdefault(key, ((
+            device["device_id"],
+            start,
+            now,
+            device.get("friendly_name"),
+            device.get("plant_type"),   # devices.plant_type 컬럼
+            device.get("room"),         # room 전달
+        ), {"device_meta": device}))
+    parts = _pdf_parts(_render_reports_pipelined(jobs, start, now))
+
+    sends = []
+    for email in recipients:
         for device in devices:
-            pdf = generate_pdf_report_by_device(
-                device["device_id"],
-                start,
-                now,
-                device.get("friendly_name"),
-                device.get("plant_type"),   # devices.plant_type 컬럼
-                device.get("room")          # room 전달
-            )
+            part = parts.get(_normalize_device_id(device["device_id"]))
+            if not part:
+                print(f"[WARN] skip {email}/{device['device_id']}: PDF 생성 실패")
+                continue
             subject = f"GreenEye 주간 식물 보고서 - {device['friendly_name']}"
             body = "안녕하세요, GreenEye 시스템에서 자동 생성된 식물 생장 보고서를 첨부드립니다."
-            send_email_with_pdf(email, subject, body, pdf)
+            sends.append((send_email_with_pdf, (email, subject, body, part)))
+    _send_batch(sends)
     print(f"--- PDF 보고서 전송 완료 ---\n")
 
+def _devices_by_owner(devices: list) -> dict:
+    """get_all_devices_any() 결과를 owner_user_id(문자열, 정수/문자열 불일치 대비)별로 한 번에 묶음"""
+    if devices and "owner_user_id" not in devices[0]:
+        print("[WARN] devices rows have no owner_user_id — 소유자별 리포트가 비게 됩니다")
+    owned_by = {}
+    for d in devices:
+        owned_by.setdefault(str(d.get("owner_user_id")), []).append(d)
+    return owned_by
+
 # 사용자별로 소유 디바이스 PDF를 모아서 한 통으로 발송
 def send_all_reports_grouped(days: int = 7):
     print(f"\n--- 그룹 전송 시작(days={days}): {datetime.now()} ---")
@@ -1161,9 +1658,13 @@ def send_all_reports_grouped(days: int = 7):
     users    = [dict(u) if not isinstance(u, dict) else u for u in _users]
     _devices = get_all_devices_any() or []
     devices  = [dict(d) if not isinstance(d, dict) else d for d in _devices]
+    owned_by = _devices_by_owner(devices)
     now      = datetime.now().astimezone(pytz.utc)
     start    = now - timedelta(days=days)
+    load_standards()  # 부모에서 미리 로드 → fork된 렌더링 워커가 캐시를 물려받아 엑셀을 다시 읽지 않음
 
+    # 1) 사용자별 소유 디바이스 확정 + PDF 작업 수집 (같은 디바이스는 1번만 생성)
+    plans, jobs = [], {}
     for u in users:
         # 동의하지 않은 사용자는 스킵
         if not bool(u.get("email_consent", 0)):
@@ -1173,30 +1674,39 @@ def send_all_reports_grouped(days: int = 7):
         uid   = u.get("id")
         if not email or uid is None:
             continue
-        # 미리 읽어둔 목록에서 owner_user_id 매칭 (문자열/정수 불일치 대비)
-        owned = [d for d in devices if str(d.get("owner_user_id")) == str(uid)]
-        # 폴백: 미리 읽은 devices에 owner_user_id가 없을 수도 있으므로, 사용자별 쿼리 함수(get_all_devices) 사용
-        if not owned:
-            _owned = get_all_devices(uid) or []
-            owned  = [dict(d) if not isinstance(d, dict) else d for d in _owned]
-            print(f"[DEBUG] fallback devices for user_id={uid}: {len(owned)} found")
+        # 미리 읽어둔 목록에서 owner_user_id 매칭 (사용자별 DB 조회 없음)
+        owned = owned_by.get(str(uid), [])
         if not owned:
             print(f"[INFO] skip {email}: no devices")
             continue
 
-        pdfs = []
+        keys = []
         for d in owned:
             dev   = d.get("device_id")
             fname = d.get("friendly_name") or dev
             plant = d.get("plant_type")
             room  = d.get("room")
+            key   = _normalize_device_id(dev)
             print(f"[INFO] generate PDF → user={email}, device={dev} ({fname})")
-            path = generate_pdf_report_by_device(dev, start, now, fname, plant, room)
-            pdfs.append(path)
+            jobs.setdefault(key, ((dev, start, now, fname, plant, room), {"device_meta": d}))
+            keys.append(key)
+        plans.append((email, keys))
+
+    # 2) 데이터 조회(묶음 단위) + PDF 병렬 생성
+    parts = _pdf_parts(_render_reports_pipelined(jobs, start, now))
+
+    # 3) 사용자별 발송 (SMTP_WORKERS개 세션이 나눠서, 세션마다 연결 1개 재사용)
+    sends = []
+    for email, keys in plans:
+        pdfs = [parts[k] for k in keys if parts.get(k)]
+        if not pdfs:
+            print(f"[WARN] skip {email}: PDF 생성 실패")
+            continue
 
         subject = f"GreenEye 주간 식물 보고서 - {len(pdfs)}개 디바이스"
         body    = "안녕하세요, GreenEye입니다.\n주간 식물 생장 보고서를 보내드립니다."
-        send_email_with_pdfs(email, subject, body, pdfs)
+        sends.append((send_email_with_pdfs, (email, subject, body, pdfs)))
+    _send_batch(sends)
     print(f"--- 그룹 전송 완료 ---\n")
 
 def send_all_reports_grouped_between(start: datetime, end: datetime):
@@ -1209,6 +1719,9 @@ def send_all_reports_grouped_between(start: datetime, end: datetime):
     users    = [dict(u) if not isinstance(u, dict) else u for u in _users]
     _devices = get_all_devices_any() or []
     devices  = [dict(d) if not isinstance(d, dict) else d for d in _devices]
+    owned_by = _devices_by_owner(devices)
+    load_standards()  # 렌더링 워커가 fork 시 캐시를 물려받도록 미리 로드
+    plans, jobs = [], {}
     for u in users:
         # 동의하지 않은 사용자는 스킵
         if not bool(u.get("email_consent", 0)):
@@ -1217,30 +1730,38 @@ def send_all_reports_grouped_between(start: datetime, end: datetime):
         email = u.get("email"); uid = u.get("id")
         if not email or uid is None:
             continue
-        owned = [d for d in devices if str(d.get("owner_user_id")) == str(uid)]
-        if not owned:
-            _owned = get_all_devices(uid) or []
-            owned  = [dict(d) if not isinstance(d, dict) else d for d in _owned]
+        owned = owned_by.get(str(uid), [])
         if not owned:
             print(f"[INFO] skip {email}: no devices"); continue
-        pdfs = []
+        keys = []
         for d in owned:
             dev   = d.get("device_id")
             fname = d.get("friendly_name") or dev
             plant = d.get("plant_type"); room = d.get("room")
+            key   = _normalize_device_id(dev)
             print(f"[INFO] generate PDF → user={email}, device={dev} ({fname})")
-            path = generate_pdf_report_by_device(dev, start, end, fname, plant, room)
-            pdfs.append(path)
-        # 제목에 디바이스 수 + 기간(KST) 요약까지 포함하면 메일함에서 식별이 쉬움
-        kst = pytz.timezone("Asia/Seoul")
-        s_k = start.astimezone(kst).strftime("%Y-%m-%d")
-        e_k = (end - timedelta(seconds=1)).astimezone(kst).strftime("%Y-%m-%d")
+            jobs.setdefault(key, ((dev, start, end, fname, plant, room), {"device_meta": d}))
+            keys.append(key)
+        plans.append((email, keys))
+
+    parts = _pdf_parts(_render_reports_pipelined(jobs, start, end))
+    # 제목에 디바이스 수 + 기간(KST) 요약까지 포함하면 메일함에서 식별이 쉬움
+    kst = pytz.timezone("Asia/Seoul")
+    s_k = start.astimezone(kst).strftime("%Y-%m-%d")
+    e_k = (end - timedelta(seconds=1)).astimezone(kst).strftime("%Y-%m-%d")
+    sends = []
+    for email, keys in plans:
+        pdfs = [parts[k] for k in keys if parts.get(k)]
+        if not pdfs:
+            print(f"[WARN] skip {email}: PDF 생성 실패"); continue
         subject = f"GreenEye 주간 식물 보고서 ({s_k}~{e_k}) - {len(pdfs)}대"
         body    = "안녕하세요, GreenEye입니다.\n주간 식물 생장 보고서를 보내드립니다."
-        send_email_with_pdfs(email, subject, body, pdfs)
+        sends.append((send_email_with_pdfs, (email, subject, body, pdfs)))
+    _send_batch(sends)
     print(f"--- 그룹 전송(지정 기간) 완료 ---\n")
    
 if __name__ == "__main__":
+    _process_pool_enabled = True  # 단독 실행 프로세스는 fork해도 안전 → PDF 생성을 프로세스 풀로 병렬화
     now_utc = datetime.now(pytz.utc)
     start_utc, end_utc = week_window_kst(now_utc)
     send_all_reports_grouped_between(start_utc, end_utc)
@@ -1,22 +1,51 @@
 import os
 import json
+import atexit
+import functools
+import math
+import threading
 import requests
 import paho.mqtt.client as mqtt
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS, WriteOptions
 import redis
 from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
 import re
 import base64
-from PIL import Image, ImageEnhance, ImageDraw, ImageFont
+from PIL import Image, ImageEnhance, ImageDraw, ImageFont, ImageStat
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 
 import csv
+import io
+import itertools
 from io import StringIO
+import pandas as pd
 
-from .database import get_db_connection, get_device_by_device_id_any
+try:
+    import orjson  # 선택 의존성: 있으면 정상 JSON 페이로드를 bytes에서 바로 파싱/직렬화
+    _fast_json_loads = orjson.loads
+
+    def _fast_json_dumps(value) -> bytes:
+        """UTF-8 JSON bytes (Redis/MQTT 모두 bytes 그대로 전송). 비문자열 키는 json.dumps처럼 문자열로"""
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    _fast_json_loads = json.loads  # json.loads도 bytes를 직접 받음 (BOM 포함 인코딩 자동 판별)
+
+    def _fast_json_dumps(value) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+_RE_CSV_BLOCK_SEP = re.compile(r"\r?\n[ \t]*\r?\n")
+# 비표준 JSON 보정용 패턴 (_safe_json_loads)
+_RE_BAD_BACKSLASH = re.compile(r'\\u[0-9a-fA-F]{4}|\\.')  # \uXXXX는 한 덩어리로 잡아야 유효 판정 가능
+_RE_VALID_ESC = re.compile(r'\\["\\/bfnrt]|\\u[0-9a-fA-F]{4}')
+_RE_SHORT_ID = re.compile(r"(?:ge-sd-)?([0-9a-f]{4})")  # 토픽 장치 ID → 4자리 short id
+_RE_PAREN_TEXT = re.compile(r"\((.*?)\)")  # '몬스테라 (Monstera)' → 'Monstera'
+_FLUX_NUMERIC_TYPES = {"double", "long", "unsignedLong"}  # Influx annotated CSV #datatype 중 float으로 읽을 타입
+
+from .database import get_db_connection, get_device_by_device_id_cached
 
 FLASH_MAP = {
     "always_on":  {"flash_en": 1, "flash_nt": 1},  # 주/야 모두 플래시
@@ -27,7 +56,7 @@ FLASH_MAP = {
 def _publish_conf(device_id: str, payload: dict):
     """GreenEye/conf/{device_id} 로 retain publish"""
     topic = f"GreenEye/conf/{device_id}"
-    body = json.dumps(payload, ensure_ascii=False)
+    body = _fast_json_dumps(payload)
     mqtt_client.publish(topic, body, qos=1, retain=True)
 
 from .inference import model_manager
@@ -39,6 +68,12 @@ if os.getenv("ENV_MODE", "local") == "local":
 
 # 안전한 JSON 디코더 (BOM/작은따옴표/잘못된 이스케이프 보정)
 def _safe_json_loads(b: bytes):
+    # 대부분의 페이로드는 정상 JSON → 디코드/보정 없이 바로 파싱
+    try:
+        return _fast_json_loads(b)
+    except ValueError:
+        pass
+
     raw = b  # 원본 보관
     s = None
     try:
@@ -57,26 +92,20 @@ def _safe_json_loads(b: bytes):
     if t.startswith("{") and "'" in t and '"' not in t.split(":", 1)[0]:
         t = t.replace("'", '"')
 
-    # 역슬래시가 잘못 들어와 Invalid \escape 터질 때 완화
-    # \n, \t 등 정상 시퀀스는 두고, 나머지 lone backslash는 이스케이프
-    import re
-    def _fix_bad_backslash(m):
-        seq = m.group(0)
-        # 유효한 \", \\, \/, \b, \f, \n, \r, \t, \uXXXX 는 그대로 둠
-        if re.match(r'\\["\\/bfnrt]', seq) or re.match(r'\\u[0-9a-fA-F]{4}', seq):
-            return seq
-        return '\\\\' + seq[1:]  # 나머지는 백슬래시 이스케이프
-
-    t = re.sub(r'\\.', _fix_bad_backslash, t)
+    # 역슬래시가 잘못 들어와 Invalid \escape 터질 때 완화 (역슬래시가 있을 때만 스캔)
+    if "\\" in t:
+        t = _RE_BAD_BACKSLASH.sub(_fix_bad_backslash, t)
 
     return json.loads(t)
 
+# \n, \t 등 정상 시퀀스는 두고, 나머지 lone backslash는 이스케이프 (_safe_json_loads용)
+def _fix_bad_backslash(m):
+    seq = m.group(0)
+    # 유효한 \", \\, \/, \b, \f, \n, \r, \t, \uXXXX 는 그대로 둠
+    if _RE_VALID_ESC.match(seq):
+        return seq
+    return '\\\\' + seq[1:]  # 나머지는 백슬래시 이스케이프
 
-def _pick(d: dict, *keys):
-    for k in keys:
-        if k in d and d[k] is not None:
-            return d[k]
-    return None
 
 def _to_float(x):
     if x is None: return None
@@ -88,9 +117,24 @@ def _to_int(x):
     try: return int(float(x))  # "40"이나 "40.0"도 정수 40으로
     except (TypeError, ValueError): return None
 
+# 센서 필드 스펙: (저장 필드명, 허용 키(우선순위 순), 타입 캐스팅)
+# 키 맵핑은 서로 다른 펌웨어/테스트 포맷 모두 수용, battery는 정수, 나머지는 float, comment는 그대로
+_FIELD_SPEC = (
+    ("battery",       ("battery", "bat_level", "bat"),     _to_int),
+    ("temperature",   ("temperature", "amb_temp", "temp"), _to_float),
+    ("humidity",      ("humidity", "amb_humi", "hum"),     _to_float),
+    ("light_lux",     ("light_lux", "amb_light", "lux"),   _to_float),
+    ("soil_temp",     ("soil_temp",),                      _to_float),
+    ("soil_moisture", ("soil_moisture", "soil_humi"),      _to_float),
+    ("soil_ec",       ("soil_ec",),                        _to_float),
+    ("comment",       ("comment",),                        None),
+)
+# 센서 페이로드로 인정하는 모든 키 (하나도 없으면 장치 조회 없이 건너뜀)
+_SENSOR_KEYS = frozenset(k for _, keys, _ in _FIELD_SPEC for k in keys)
+
     
 # --- 환경 변수 ---
-MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST")
+MQTT_BROKER_HOST = os.getenv("MQTT_BROKER_HOST", "localhost")
 MQTT_BROKER_PORT = int(os.getenv("MQTT_BROKER_PORT", "1883"))
 MQTT_USERNAME = os.getenv("MQTT_USERNAME")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
@@ -100,6 +144,11 @@ INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN")
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET")
 INFLUXDB_ORG = os.getenv("INFLUXDB_ORG")
 INFLUX_MEASUREMENT = os.getenv("INFLUX_MEASUREMENT", "sensor_readings")
+# 센서 쓰기 배치: 메시지마다 HTTP 왕복하지 않고 클라이언트 버퍼에 모아 batch_size개 또는 flush 주기마다 전송
+INFLUX_BATCH_WRITES = os.getenv("INFLUX_BATCH_WRITES", "1") == "1"  # 0이면 기존처럼 동기 쓰기
+INFLUX_BATCH_SIZE = int(os.getenv("INFLUX_BATCH_SIZE", "5000"))
+INFLUX_FLUSH_INTERVAL_MS = int(os.getenv("INFLUX_FLUSH_INTERVAL_MS", "1000"))
+INFLUX_DEBUG = os.getenv("INFLUX_DEBUG", "0") == "1"  # 1이면 쓰기마다 line protocol 출력
 
 # 컨테이너 안에서 'localhost'로 잡히면 서비스명으로 강제 전환
 _env_mode = os.getenv("ENV_MODE", "docker").lower()
@@ -112,6 +161,10 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 
 IMAGE_UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), "images")
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))  # 이미지 디코드/보정/저장 워커 수
+IMAGE_QUEUE_MAX = int(os.getenv("IMAGE_QUEUE_MAX", "16"))  # 처리 중+대기 중 이미지 작업 최대 개수 (초과분은 버림)
+IMAGE_SAVE_B16 = os.getenv("IMAGE_SAVE_B16", "0") == "1"  # 1이면 .jpg와 같은 바이트의 16진 텍스트(.b16)도 저장
+_image_folder_ready = False  # 저장 폴더는 프로세스당 한 번만 생성 (이미지마다 makedirs 하지 않음)
 
 # --- 클라이언트 ---
 mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
@@ -123,11 +176,13 @@ query_api = None
 # --- Redis 연결 ---
 def connect_redis():
     global redis_client
+    if redis_client is not None:  # 이미 연결됨 — 커넥션 풀 재생성 방지
+        return
     try:
         redis_client = redis.Redis(
-            host=os.getenv("REDIS_HOST", "redis"),
-            port=int(os.getenv("REDIS_PORT", "6379")),
-            password=os.getenv("REDIS_PASSWORD") or None,
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD or None,
             db=0,
             decode_responses=True,
             health_check_interval=30,
@@ -140,10 +195,52 @@ def connect_redis():
         redis_client = None
         print(f"Redis connection failed: {e}")
 
+def _on_influx_batch_error(conf, data, exception):
+    """배치 전송 실패 콜백 (재시도까지 실패한 배치)"""
+    lines = data.count(b"\n") + 1 if isinstance(data, bytes) else data.count("\n") + 1
+    print(f"[Influx] batch write failed ({lines} points, bucket={conf[0]}): {exception}")
+
+def _new_write_api(client):
+    """쓰기 API 생성. 기본은 배치 모드: write()는 버퍼에 넣고 바로 반환,
+    백그라운드 스레드가 INFLUX_BATCH_SIZE개 또는 INFLUX_FLUSH_INTERVAL_MS마다 묶어서 전송"""
+    if not INFLUX_BATCH_WRITES:
+        return client.write_api(write_options=SYNCHRONOUS)
+    return client.write_api(
+        write_options=WriteOptions(
+            batch_size=INFLUX_BATCH_SIZE,
+            flush_interval=INFLUX_FLUSH_INTERVAL_MS,
+            jitter_interval=0,
+            retry_interval=5000,
+        ),
+        error_callback=_on_influx_batch_error,
+    )
+
+def _close_write_api():
+    """현재 쓰기 API를 닫음 — 배치 모드면 버퍼에 남은 포인트를 전송한 뒤 종료"""
+    global influxdb_write_api
+    api, influxdb_write_api = influxdb_write_api, None
+    if api is not None:
+        try:
+            api.close()
+        except Exception as e:
+            print(f"[Influx] write_api close failed: {e}")
+
+def shutdown_services():
+    """종료 경로에서 명시적으로 호출 (gunicorn worker_exit 훅 등).
+    배치 전송 스레드풀이 살아 있는 인터프리터 종료 전에 Influx 배치 버퍼를 flush"""
+    _close_write_api()
+
+# 보조 훅: 이미 닫혔으면 아무것도 안 함. atexit 시점에는 배치 전송 스레드풀이 먼저 닫혀 있어
+# flush가 실패할 수 있으므로, 종료 경로(gunicorn.conf.py worker_exit, wsgi 로컬 실행)에서 shutdown_services()를 호출
+atexit.register(_close_write_api)
+
 def connect_influxdb():
     """InfluxDB v2 연결"""
     global influxdb_client, influxdb_write_api, query_api
+    if influxdb_client is not None:  # 이미 연결됨 (report_generator import 시 연결된 경우 포함)
+        return
     print(f"[InfluxDB] connecting url={INFLUXDB_URL}, org={INFLUXDB_ORG}, bucket={INFLUXDB_BUCKET}")
+    _close_write_api()  # 재연결 시 이전 배치 버퍼를 먼저 비움
     try:
         influxdb_client = InfluxDBClient(
             url=INFLUXDB_URL,
@@ -151,7 +248,7 @@ def connect_influxdb():
             org=INFLUXDB_ORG,
             timeout=30000,
         )
-        influxdb_write_api = influxdb_client.write_api(write_options=SYNCHRONOUS)
+        influxdb_write_api = _new_write_api(influxdb_client)
         query_api = influxdb_client.query_api()
         print("InfluxDB connected.")
     except Exception as e:
@@ -168,28 +265,18 @@ def on_connect(client, userdata, flags, rc):
     else:
         print(f"Failed to connect to MQTT broker, return code {rc}")
 
-def _parse_mqtt_payload(b: bytes):
-    s = b.decode("utf-8", "replace").strip()
-    # 1차: 정상 JSON 시도
-    try:
-        return json.loads(s)
-    except Exception:
-        pass
-    # 2차: 흔한 오류 보정
-    t = s.replace("'", '"')  # 작은따옴표 -> 큰따옴표
-    # {key: ...} 형태의 키에 따옴표 붙이기
-    t = re.sub(r'([{,]\s*)([A-Za-z_][A-Za-z0-9_]*)\s*:', r'\1"\2":', t)
-    # device_id / time 값이 따옴표 없이 올 때 보정
-    t = re.sub(r'("device_id"\s*:\s*)([A-Za-z0-9_\-]+)', r'\1"\2"', t)
-    t = re.sub(r'("(_time|time)"\s*:\s*)([^",}\s][^,}\s]*)', r'\1"\3"', t)
-    return json.loads(t)
-
 # --- MQTT 콜백 ---
 def on_message(client, userdata, msg):
     print(f"MQTT Message received: Topic - {msg.topic}")
     if msg.topic.startswith("GreenEye/data/"):
         try:
             payload = _safe_json_loads(msg.payload)
+            # 문자열로 한 번 더 감싸진(이중 인코딩) JSON이면 여기서 한 번만 풀어줌
+            if isinstance(payload, str):
+                payload = _safe_json_loads(payload.encode("utf-8"))
+            if not isinstance(payload, dict):
+                print(f"[WARN] unexpected payload type {type(payload).__name__} on {msg.topic}; skip")
+                return
             process_incoming_data(msg.topic, payload)
         except Exception as e:
             print(f"Error processing incoming data: {e}")
@@ -201,9 +288,11 @@ def on_message(client, userdata, msg):
 
 
 def connect_mqtt():
-    # ✅ 환경변수에서 가져오되 없으면 기본값 사용
-    broker_host = os.getenv("MQTT_BROKER_HOST", "localhost")
-    broker_port = int(os.getenv("MQTT_BROKER_PORT", 1883))
+    if mqtt_client.is_connected():  # 이미 연결됨 — 네트워크 루프 재시작 방지
+        return
+    # ✅ 환경변수(모듈 로드 시 1회 읽음)에서 가져오되 없으면 기본값 사용
+    broker_host = MQTT_BROKER_HOST
+    broker_port = MQTT_BROKER_PORT
 
     if MQTT_USERNAME and MQTT_PASSWORD:
         mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
@@ -219,10 +308,86 @@ def connect_mqtt():
 
 
 
-def write_sensor_data_to_influxdb(measurement, tags, fields, ts=None):
-    from influxdb_client import Point, WritePrecision
-    from datetime import datetime, timezone
+@functools.lru_cache(maxsize=2048)
+def _parse_ts_str(s: str) -> datetime:
+    """문자열 타임스탬프(epoch s/ms 숫자 문자열, ISO8601/Z) → UTC datetime. 같은 문자열은 캐시"""
+    s = s.strip()
+    if s.isdigit():
+        iv = int(s)
+        return datetime.fromtimestamp(iv / (1000.0 if iv > 1e12 else 1.0), tz=timezone.utc)
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    ts_dt = datetime.fromisoformat(s)
+    return ts_dt if ts_dt.tzinfo is not None else ts_dt.replace(tzinfo=timezone.utc)
+
+def _parse_ts(ts):
+    """타임스탬프(ISO8601 / epoch seconds / epoch ms) → UTC datetime, 지원하지 않는 타입이면 None"""
+    if isinstance(ts, str):
+        return _parse_ts_str(ts)
+    if isinstance(ts, (int, float)):
+        return datetime.fromtimestamp(ts / 1000.0 if ts > 1e12 else ts, tz=timezone.utc)  # ms / s
+    return None
 
+# line protocol 이스케이프 규칙 (influxdb_client Point와 동일)
+_LP_ESCAPE_MEASUREMENT = str.maketrans({",": r"\,", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_LP_ESCAPE_KEY = str.maketrans({",": r"\,", "=": r"\=", " ": r"\ ", "\n": r"\n", "\t": r"\t", "\r": r"\r"})
+_LP_ESCAPE_STRING = str.maketrans({'"': r'\"', "\\": r"\\"})
+_LP_EPOCH = datetime.fromtimestamp(0, tz=timezone.utc)
+
+@functools.lru_cache(maxsize=1024, typed=True)
+def _lp_key(k) -> str:
+    """태그/필드 키 이스케이프 (키와 device 태그 값은 메시지마다 반복되므로 캐시)"""
+    return str(k).translate(_LP_ESCAPE_KEY)
+
+@functools.lru_cache(maxsize=1024, typed=True)
+def _lp_tag_value(v) -> str:
+    tv = str(v).translate(_LP_ESCAPE_KEY)
+    return tv + " " if tv.endswith("\\") else tv
+
+def _to_line_protocol(measurement: str, tags: dict, fields: dict, ts_dt=None) -> str:
+    """Point(...).to_line_protocol()과 같은 문자열을 Point 객체 없이 바로 생성 (센서 쓰기 핫패스용).
+    태그/필드는 키 정렬, None과 NaN/inf 필드는 제외, 정수는 'i' 접미사, ts_dt는 ns 정밀도.
+    유효한 필드가 없으면 "" 반환."""
+    field_parts = []
+    for k, v in sorted(fields.items()):
+        if v is None:
+            continue
+        if isinstance(v, float):
+            if not math.isfinite(v):
+                continue
+            sv = str(v)
+            if sv.endswith(".0"):
+                sv = sv[:-2]
+        elif isinstance(v, bool):
+            sv = "true" if v else "false"
+        elif isinstance(v, int):
+            sv = f"{v}i"
+        elif isinstance(v, str):
+            sv = f'"{v.translate(_LP_ESCAPE_STRING)}"'
+        else:
+            raise ValueError(f'Type: "{type(v)}" of field: "{k}" is not supported.')
+        field_parts.append(f"{_lp_key(k)}={sv}")
+    if not field_parts:
+        return ""
+
+    line = str(measurement).translate(_LP_ESCAPE_MEASUREMENT)
+    for k, v in sorted(tags.items()):
+        if v is None:
+            continue
+        tk = _lp_key(k)
+        tv = _lp_tag_value(v)
+        if tk and tv:
+            line += f",{tk}={tv}"
+    line += " " + ",".join(field_parts)
+
+    if ts_dt is not None:
+        if ts_dt.tzinfo is None:
+            ts_dt = ts_dt.replace(tzinfo=timezone.utc)
+        delta = ts_dt.astimezone(timezone.utc) - _LP_EPOCH
+        line += f" {(delta.days * 86400 + delta.seconds) * 10**9 + delta.microseconds * 1000}"
+    return line
+
+def write_sensor_data_to_influxdb(measurement, tags, fields, ts=None):
     global influxdb_client, influxdb_write_api
     if influxdb_client is None:
         connect_influxdb()
@@ -230,57 +395,42 @@ def write_sensor_data_to_influxdb(measurement, tags, fields, ts=None):
     # lazy init or recreate write_api
     if influxdb_write_api is None:
         try:
-            influxdb_write_api = influxdb_client.write_api(write_options=SYNCHRONOUS)
+            influxdb_write_api = _new_write_api(influxdb_client)
         except Exception as e:
             print(f"[Influx] write_api init failed: {e}")
             return
     
-    point = Point(measurement)
-    for k, v in (tags or {}).items():
-        point.tag(k, v)
-    for k, v in (fields or {}).items():
-        # Influx는 float/int만 필드에 허용 → None은 건너뜀
-        if v is not None:
-            point.field(k, v)
-    
-
     # ✅ 타임스탬프 반영 (ISO8601 / epoch seconds / epoch ms 모두 허용)
+    ts_dt = None
     if ts:
         try:
-            ts_dt = None
-            if isinstance(ts, (int, float)):
-                if ts > 1e12:  # ms
-                    ts_dt = datetime.fromtimestamp(ts / 1000.0, tz=timezone.utc)
-                else:          # s
-                    ts_dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-            elif isinstance(ts, str):
-                s = ts.strip()
-                if s.isdigit():
-                    iv = int(s)
-                    ts_dt = datetime.fromtimestamp(
-                        iv / (1000.0 if iv > 1e12 else 1.0), tz=timezone.utc
-                    )
-                else:
-                    if s.endswith("Z"):
-                        s = s[:-1] + "+00:00"
-                    ts_dt = datetime.fromisoformat(s)
-                    if ts_dt.tzinfo is None:
-                        ts_dt = ts_dt.replace(tzinfo=timezone.utc)
-            if ts_dt:
-                point.time(ts_dt, WritePrecision.NS)
+            ts_dt = _parse_ts(ts)
         except Exception as e:
             print(f"[Influx] invalid ts '{ts}': {e} ( → server time )")
-    lp = point.to_line_protocol()
-    print(f"[Influx] write TRY bucket={INFLUXDB_BUCKET} org={INFLUXDB_ORG} lp={lp}")
 
-    # 실제 쓰기 — 실패 시 1회 재연결 후 재시도
-    try:
-        lp = point.to_line_protocol()  # 🔍 디버깅용
+    # Point 객체 없이 line protocol을 한 번만 만들어 그대로 전송 (None 필드는 제외)
+    lp = _to_line_protocol(measurement, tags or {}, fields or {}, ts_dt)
+    if not lp:
+        # 유효한 필드가 없음(전부 None/NaN/inf) → 빈 레코드는 보내지 않음
+        print(f"[Influx] skip write: no valid fields for tags={tags}")
+        return
+    if INFLUX_DEBUG:
         print(f"[Influx] write TRY bucket={INFLUXDB_BUCKET} org={INFLUXDB_ORG} lp={lp[:200]}")
-        influxdb_write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=point)
-        print("[Influx] write OK")
+
+    # 배치 모드: write()는 버퍼에 넣기만 함 — 실제 전송 실패는 _on_influx_batch_error가 보고
+    if INFLUX_BATCH_WRITES:
+        try:
+            influxdb_write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=lp)
+        except Exception as e:
+            print(f"[Influx] batch enqueue failed: {e}")
+        return
+
+    # 동기 모드: 실제 쓰기 — 실패 시 1회 재연결 후 재시도
+    try:
+        influxdb_write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=lp)
     except Exception as e:
         print(f"[Influx] write failed once, retrying with fresh client: {e}")
+        _close_write_api()
         try:
             influxdb_client.close() if influxdb_client else None
         except Exception:
@@ -288,9 +438,9 @@ def write_sensor_data_to_influxdb(measurement, tags, fields, ts=None):
         influxdb_client = InfluxDBClient(
             url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG, timeout=30000
         )
-        influxdb_write_api = influxdb_client.write_api(write_options=SYNCHRONOUS)
+        influxdb_write_api = _new_write_api(influxdb_client)
         try:
-            influxdb_write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=point)
+            influxdb_write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=lp)
             print("[Influx] write OK after reconnect")
         except Exception as e2:
             print(f"[Influx] write retry failed: {e2}")
@@ -307,34 +457,62 @@ def query_influxdb_data(query: str):
         }
         params = {"org": INFLUXDB_ORG}
 
-        response = requests.post(url, params=params, data=query.encode("utf-8"), headers=headers)
-        response.raise_for_status()
+        # 응답 전체를 메모리에 올리지 않고 줄 단위로 받아 바로 CSV 파싱
+        with requests.post(url, params=params, data=query.encode("utf-8"), headers=headers, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # gzip 응답도 풀어서 읽기
+            response.raw.auto_close = False  # 다 읽은 뒤 자동 close되면 TextIOWrapper가 닫힌 파일 오류를 냄
+            # newline="": 따옴표 안 줄바꿈까지 csv 모듈이 그대로 처리하도록 줄 끝 유지
+            lines = io.TextIOWrapper(response.raw, encoding="utf-8", errors="replace", newline="")
 
-        decoded = response.content.decode("utf-8", errors="replace")
-        
-        
-        # 🔍 응답 확인용 프리뷰/길이
-        preview = "\n".join(decoded.splitlines()[:20])
-        print(f"[DEBUG] Influx CSV bytes={len(response.content)} / lines_preview=\n{preview}")
-
-        rows = parse_csv_result(decoded)
-        print(f"[DEBUG] parsed_rows_count={len(rows)}")
-        if rows:
-            print(f"[DEBUG] parsed_sample_keys={list(rows[0].keys())}")
-        return rows
-        print(f"[DEBUG] parsed_rows={len(rows)}")
+            # 🔍 응답 확인용 프리뷰
+            head = list(itertools.islice(lines, 20))
+            preview = "".join(head).rstrip("\r\n")
+            print(f"[DEBUG] Influx CSV lines_preview=\n{preview}")
+
+            rows = parse_csv_result(itertools.chain(head, lines))
         return rows
     except Exception as e:
         print(f"[InfluxDB] Query failed: {e}")
         return None
 
 
+def query_influxdb_data_df(query: str):
+    """
+    query_influxdb_data와 같은 요청이지만, 응답 CSV를 행 dict 목록 대신
+    pandas DataFrame으로 바로 읽는다 (C 파서, 행 단위 파이썬 객체 생성 없음).
+    #datatype 주석의 double/long 컬럼은 float, dateTime 컬럼은 UTC datetime64,
+    나머지는 문자열로 읽음(device_id '2e52'가 숫자로 바뀌지 않도록).
+    실패 시 None.
+    """
+    print(f"[DEBUG] 실행할 Flux 쿼리(df):\n{query}")
+    try:
+        url = f"{INFLUXDB_URL}/api/v2/query"
+        headers = {
+            "Authorization": f"Token {INFLUXDB_TOKEN}",
+            "Accept": "application/csv"
+        }
+        params = {"org": INFLUXDB_ORG}
+        # #datatype 주석을 함께 받아 숫자 컬럼은 CSV 파서에서 바로 float으로 읽는다 (parse_csv_frame)
+        body = {"query": query, "type": "flux", "dialect": {"header": True, "annotations": ["datatype"]}}
+
+        response = requests.post(url, params=params, json=body, headers=headers)
+        response.raise_for_status()
+
+        df = parse_csv_frame(response.content.decode("utf-8", errors="replace"))
+        print(f"[DEBUG] Influx CSV bytes={len(response.content)} / parsed_rows_count={len(df)}")
+        return df
+    except Exception as e:
+        print(f"[InfluxDB] Query failed: {e}")
+        return None
+
+
 def set_redis_data(key: str, value):
     if not redis_client:
         print(f"[REDIS] client not ready; skip set {key}")
         return
     try:
-        redis_client.set(key, json.dumps(value))
+        redis_client.set(key, _fast_json_dumps(value))
         print(f"[REDIS] SET {key} -> {value}")
     except Exception as e:
         print(f"Error setting data in Redis: {e}")
@@ -381,13 +559,13 @@ def run_inference_on_image(device_id: str, image_path: str):
         plant_type = "default"  # 기본값, 실제로는 DB나 설정에서 가져와야 함
         
         # device 정보에서 plant_type 가져오기 시도
-        device_info = get_device_by_device_id_any(device_id)
+        device_info = get_device_by_device_id_cached(device_id)
         if device_info and device_info.get('plant_type'):
             raw_plant_type = device_info['plant_type']
             
             # find text inside parentheses
             # fallback to raw string if no match
-            match = re.search(r'\((.*?)\)', raw_plant_type)
+            match = _RE_PAREN_TEXT.search(raw_plant_type)
             if match:
                 plant_type = match.group(1).strip()
             else:
@@ -436,163 +614,229 @@ def run_inference_on_image(device_id: str, image_path: str):
 
 
 # --- 데이터 파이프라인 ---
-def process_incoming_data(topic: str, payload):
+# 이미지 처리/AI 추론은 paho 네트워크 스레드 밖에서 수행 (센서 메시지 수신이 추론에 막히지 않도록)
+_image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+# ThreadPoolExecutor 대기열은 무제한이라 이미지 폭주 시 base64 페이로드가 메모리에 쌓임 → 슬롯으로 상한
+_image_slots = threading.BoundedSemaphore(max(IMAGE_QUEUE_MAX, 1))
+# model_manager의 모델 캐시가 락 없이 채워지므로 추론은 단일 스레드에서 순차 실행
+_inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+# 이미지 메타 INSERT: 워커 스레드별로 재사용되는 연결의 statement 캐시에 한 번만 준비됨
+_SQL_INSERT_PLANT_IMAGE = (
+    "INSERT INTO plant_images (device_id, mac_address, filename, filepath, timestamp) VALUES (?, ?, ?, ?, ?)"
+)
+
+# 장치별 추론 대기 슬롯 (최신 이미지만 유지): device_id -> (filename, path_jpg)
+# 추론보다 이미지가 빨리 들어오면 대기 중인 이전 이미지는 건너뛰고 최신 것만 진단
+_pending_inference = {}
+_pending_inference_lock = threading.Lock()
+
+def _schedule_inference(device_id: str, filename: str, path_jpg: str):
+    """장치의 최신 이미지로 추론 예약. 이미 대기 중인 작업이 있으면 대상 이미지만 교체"""
+    with _pending_inference_lock:
+        queued = device_id in _pending_inference
+        _pending_inference[device_id] = (filename, path_jpg)
+    if queued:
+        print(f"[DEBUG] inference already pending for {device_id}; replaced with {filename}")
+        return
+    _inference_executor.submit(_infer_latest, device_id)
+
+def _infer_latest(device_id: str):
+    """추론 스레드 진입점: 실행 시점의 최신 이미지를 꺼내 진단"""
+    with _pending_inference_lock:
+        filename, path_jpg = _pending_inference.pop(device_id)
+    _infer_and_cache(device_id, filename, path_jpg)
+
+def _infer_and_cache(device_id: str, filename: str, path_jpg: str):
+    """추론 스레드: 진단 후 진단 결과만 Redis에 갱신 (latest_image는 저장 직후 이미지 워커가 갱신)"""
+    diagnosis = run_inference_on_image(device_id, path_jpg)
+    set_redis_data(f"latest_ai_diagnosis:{device_id}", diagnosis)
+    print(f"AI inference complete for {device_id} ({filename})")
+
+def _submit_image_job(device_id: str, mac, payload: dict) -> bool:
+    """이미지 작업을 워커 풀에 넣음. 슬롯이 없으면(대기열 가득) 버리고 False"""
+    if not _image_slots.acquire(blocking=False):
+        print(f"[WARN] image queue full ({IMAGE_QUEUE_MAX}); drop image from {device_id}")
+        return False
     try:
-        # 추가: 혹시 문자열로 오면 json.loads 한 번 더
-        if isinstance(payload, (bytes, str)):
-            if isinstance(payload, bytes):
-                payload = payload.decode("utf-8", errors="ignore")
-            payload = json.loads(payload)
+        _image_executor.submit(_run_image_job, device_id, mac, payload)
+    except Exception:
+        _image_slots.release()
+        raise
+    return True
+
+def _run_image_job(device_id: str, mac, payload: dict):
+    """이미지 워커 진입점: 처리가 끝나면(실패 포함) 슬롯 반환"""
+    try:
+        _process_image_payload(device_id, mac, payload)
+    finally:
+        _image_slots.release()
+
+# 이미지 보정 계수 (밝기 → 대비 → 채도 → 선명도 순으로 적용)
+_ENHANCE_BRIGHTNESS = 1.2   # 20% brighter
+_ENHANCE_CONTRAST   = 1.2   # 20% more contrast
+_ENHANCE_SATURATION = 1.2   # 20% more saturation
+_ENHANCE_SHARPNESS  = 1.3   # 30% more sharpness
+_GRADIENT_L = Image.frombytes("L", (256, 1), bytes(range(256)))  # 0..255 한 줄짜리 LUT 원본
+
+@functools.lru_cache(maxsize=256)
+def _blend_lut(base: int, factor: float) -> tuple:
+    """Image.blend(단색 base 이미지, 원본, factor)와 같은 채널별 LUT.
+    PIL blend 자체로 만들므로 float 계산/절삭까지 ImageEnhance와 동일"""
+    return tuple(Image.blend(Image.new("L", (256, 1), base), _GRADIENT_L, factor).tobytes())
+
+def _enhance_image(img):
+    """ImageEnhance Brightness/Contrast/Color/Sharpness 순차 보정과 같은 결과.
+    RGB/L에서는 밝기·대비가 채널별 단색 blend라 LUT(point)로 적용 — 단색 이미지 생성과 blend 패스 생략"""
+    if img.mode in ("RGB", "L"):
+        lut_bands = len(img.getbands())
+        out = img.point(_blend_lut(0, _ENHANCE_BRIGHTNESS) * lut_bands)
+        # ImageEnhance.Contrast와 같은 기준값: 밝기 보정 후 그레이스케일 평균(반올림)
+        mean = int(ImageStat.Stat(out.convert("L")).mean[0] + 0.5)
+        out = out.point(_blend_lut(mean, _ENHANCE_CONTRAST) * lut_bands)
+    else:
+        # 알파 채널/CMYK 등은 기존 ImageEnhance 경로 (단색 degenerate가 채널별로 같지 않음)
+        out = ImageEnhance.Brightness(img).enhance(_ENHANCE_BRIGHTNESS)
+        out = ImageEnhance.Contrast(out).enhance(_ENHANCE_CONTRAST)
+    out = ImageEnhance.Color(out).enhance(_ENHANCE_SATURATION)
+    return ImageEnhance.Sharpness(out).enhance(_ENHANCE_SHARPNESS)
+
+def _process_image_payload(device_id: str, mac, payload: dict):
+    """이미지 워커: Base64 디코드 → 보정 → 파일/DB 저장 후 추론 예약"""
+    global _image_folder_ready
+    try:
+        # Handling Image Data
+        # ~.jpg for enhanced image data
+        # ~_wstamp.jpg for enhanced image data with timestamp
+        # ~.b16 for base16 encoded text data (IMAGE_SAVE_B16=1일 때만)
+        image_base64 = payload.get("plant_img")
+        if image_base64 and isinstance(image_base64, str):
+            image_dec = base64.b64decode(image_base64)
+
+            with Image.open(BytesIO(image_dec)) as img:
+                img_enhanced = _enhance_image(img)
+
+            buffer = BytesIO()
+            img_enhanced.save(buffer, 'JPEG', quality=100)
+            enhanced_image_bytes = buffer.getbuffer()  # 복사 없이 버퍼를 그대로 사용
+
+            img_with_stamp = img_enhanced.copy() # copy for draw timestamp
+            draw = ImageDraw.Draw(img_with_stamp)
+
+            current_time = datetime.now()
+            timestamp_text = current_time.strftime(f"{device_id}_%Y-%m-%d %H:%M:%S")
+
+            try:
+                font = ImageFont.truetype("arial.ttf", size=20) #font select
+            except IOError:
+                font = ImageFont.load_default()
+
+            img_width, img_height = img_with_stamp.size
+            bbox = draw.textbbox((0, 0), timestamp_text, font=font)
+            text_width = bbox[2] - bbox[0]
+            text_height = bbox[3] - bbox[1]
+            margin = 15
+            x = img_width - text_width - margin
+            y = img_height - text_height - margin
+
+            # draw timestamp
+            draw.text((x, y), timestamp_text, font=font, fill="white", stroke_width=2, stroke_fill="black")
+
+            # save wstamp
+            buffer_wstamp = BytesIO()
+            img_with_stamp.save(buffer_wstamp, 'JPEG', quality=100)
+            stamped_image_bytes = buffer_wstamp.getbuffer()
+
+            filename = f"{device_id}_{current_time.strftime('%Y%m%d%H%M%S')}"
+            filename_jpg = f"{filename}.jpg"
+            filename_jpg_wStamp = f"{filename}_wstamp.jpg"
+
+            path_jpg = os.path.join(IMAGE_UPLOAD_FOLDER, filename_jpg)
+            path_jpg_wStamp = os.path.join(IMAGE_UPLOAD_FOLDER, filename_jpg_wStamp)
+
+            if not _image_folder_ready:
+                os.makedirs(IMAGE_UPLOAD_FOLDER, exist_ok=True)
+                _image_folder_ready = True
+
+            with open(path_jpg, "wb") as f:
+                f.write(enhanced_image_bytes)
+            with open(path_jpg_wStamp, "wb") as f:
+                f.write(stamped_image_bytes)
+            if IMAGE_SAVE_B16:
+                # .jpg와 같은 내용의 16진 텍스트 — 읽는 곳이 없어 기본은 생략 (2배 크기 인코딩 + 쓰기 절약)
+                with open(os.path.join(IMAGE_UPLOAD_FOLDER, f"{filename}.b16"), "wb") as f:
+                    f.write(base64.b16encode(enhanced_image_bytes))
+
+            if mac:
+                try:
+                    with get_db_connection() as conn:
+                        conn.execute(
+                            _SQL_INSERT_PLANT_IMAGE,
+                            (device_id, mac, filename, path_jpg, datetime.utcnow().isoformat()),
+                        )
+                        conn.commit()
+                except Exception as e:
+                    print(f"Failed to save image meta to DB for {device_id}: {e}")
+            else:
+                # 디바이스 미등록이면 plant_images는 device_id / mac_address NOT NULL 때문에 에러 나니 저장 스킵
+                print(f"Skip DB insert for image because device not registered: {device_id}")
+
+            # 최신 이미지는 저장 즉시 노출 (추론 대기열과 무관하게)
+            set_redis_data(f"latest_image:{device_id}", {"filename": filename})
+            print(f"Image saved: {path_jpg}")
+
+            # 추론은 전용 스레드로 넘기고 이미지 워커는 바로 다음 작업으로
+            _schedule_inference(device_id, filename, path_jpg)
+    except (base64.binascii.Error, TypeError) as e:
+        print(f"Error decoding Base64 string for device {device_id}: {e}")
+    except Exception as e:
+        print(f"Error processing image for device {device_id}: {e}")
 
+def process_incoming_data(topic: str, payload: dict):
+    """on_message에서 한 번 파싱된 dict 페이로드를 처리"""
+    try:
         # 토픽: GreenEye/data/{DeviceID}
         # ✅ 항상 4자리 short id로 정규화 (ge-sd-2e52 -> 2e52)
         raw_id = topic.split("/")[-1].strip().lower()
-        m = re.fullmatch(r"(?:ge-sd-)?([0-9a-f]{4})", raw_id)
+        m = _RE_SHORT_ID.fullmatch(raw_id)
         device_id = m.group(1) if m else raw_id
         print(f"Processing data for device_id: {device_id}")
 
-        dev = get_device_by_device_id_any(device_id)
+        # 이미지/센서 키가 하나도 없으면 저장할 것이 없으므로 장치 조회 전에 종료
+        if "plant_img" not in payload and _SENSOR_KEYS.isdisjoint(payload):
+            print(f"[WARN] no sensor/image keys in payload for {device_id}; skip")
+            return
+
+        dev = get_device_by_device_id_cached(device_id)
         mac = dev["mac_address"] if dev else None
 
         # --- 데이터 종류에 따라 분기 처리 (plant_img 키 유무로 판단) ---
         if "plant_img" in payload:
-            try: 
-                # Handling Image Data
-                # ~.jpg for enhanced image data
-                # ~_wstamp.jpg for enhanced image data with timestamp
-                # ~.b16 for base16 encoded text data
-                image_base64 = payload.get("plant_img")
-                if image_base64 and isinstance(image_base64, str):
-                    image_dec = base64.b64decode(image_base64)
-
-                    brightness_factor = 1.2   # 20% brighter
-                    contrast_factor   = 1.2   # 20% more contrast
-                    saturation_factor = 1.2   # 20% more saturation
-                    sharpness_factor  = 1.3   # 30% more sharpness
-
-                    with Image.open(BytesIO(image_dec)) as img:
-                        # === apply enhancements sequentially ===
-                        enhancer = ImageEnhance.Brightness(img)
-                        img_enhanced = enhancer.enhance(brightness_factor)
-                        
-                        enhancer = ImageEnhance.Contrast(img_enhanced)
-                        img_enhanced = enhancer.enhance(contrast_factor)
-                        
-                        enhancer = ImageEnhance.Color(img_enhanced)
-                        img_enhanced = enhancer.enhance(saturation_factor)
-
-                        enhancer = ImageEnhance.Sharpness(img_enhanced)
-                        img_enhanced = enhancer.enhance(sharpness_factor)
-                    
-                    buffer = BytesIO()
-                    img_enhanced.save(buffer, 'JPEG', quality=100)
-                    enhanced_image_bytes = buffer.getvalue()
-
-                    img_with_stamp = img_enhanced.copy() # copy for draw timestamp
-                    draw = ImageDraw.Draw(img_with_stamp)
-
-                    current_time = datetime.now()
-                    timestamp_text = current_time.strftime(f"{device_id}_%Y-%m-%d %H:%M:%S")
-
-                    try:
-                        font = ImageFont.truetype("arial.ttf", size=20) #font select
-                    except IOError:
-                        font = ImageFont.load_default()
-
-                    img_width, img_height = img_with_stamp.size
-                    bbox = draw.textbbox((0, 0), timestamp_text, font=font)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                    margin = 15
-                    x = img_width - text_width - margin
-                    y = img_height - text_height - margin
-
-                    # draw timestamp
-                    draw.text((x, y), timestamp_text, font=font, fill="white", stroke_width=2, stroke_fill="black")
-
-                    # save wstamp
-                    buffer_wstamp = BytesIO()
-                    img_with_stamp.save(buffer_wstamp, 'JPEG', quality=100)
-                    stamped_image_bytes = buffer_wstamp.getvalue()
-
-                    image_base16 = base64.b16encode(enhanced_image_bytes)
-                    image_base16_str = image_base16.decode('UTF-8')
-
-                    filename = f"{device_id}_{current_time.strftime('%Y%m%d%H%M%S')}"
-                    filename_jpg = f"{filename}.jpg"
-                    filename_jpg_wStamp = f"{filename}_wstamp.jpg"
-                    filename_origin = f"{filename}.b16"
-
-                    path_jpg = os.path.join(IMAGE_UPLOAD_FOLDER, filename_jpg)
-                    path_jpg_wStamp = os.path.join(IMAGE_UPLOAD_FOLDER, filename_jpg_wStamp)
-                    path_origin = os.path.join(IMAGE_UPLOAD_FOLDER, filename_origin)
-
-                    os.makedirs(IMAGE_UPLOAD_FOLDER, exist_ok=True)
-
-                    with open(path_jpg, "wb") as f:
-                        f.write(enhanced_image_bytes)
-                    with open(path_jpg_wStamp, "wb") as f:
-                        f.write(stamped_image_bytes)
-                    with open(path_origin, "w", encoding="utf-8") as f:
-                        f.write(image_base16_str)
-
-                    if mac:
-                        try:
-                            with get_db_connection() as conn:
-                                conn.execute(
-                                    "INSERT INTO plant_images (device_id, mac_address, filename, filepath, timestamp) VALUES (?, ?, ?, ?, ?)",
-                                    (device_id, mac, filename, path_jpg, datetime.utcnow().isoformat()),
-                                )
-                                conn.commit()
-                        except Exception as e:
-                            print(f"Failed to save image meta to DB for {device_id}: {e}")
-                    else:
-                        # 디바이스 미등록이면 plant_images는 device_id / mac_address NOT NULL 때문에 에러 나니 저장 스킵
-                        print(f"Skip DB insert for image because device not registered: {device_id}")
-
-                    set_redis_data(f"latest_image:{device_id}", {"filename": filename})
-                    print(f"Image saved: {path_jpg}")
-
-                    diagnosis = run_inference_on_image(device_id, path_jpg)
-                    set_redis_data(f"latest_ai_diagnosis:{device_id}", diagnosis)
-                    print(f"AI inference complete for {device_id}")
-            except (base64.binascii.Error, TypeError) as e:
-                print(f"Error decoding Base64 string for device {device_id}: {e}")
+            _submit_image_job(device_id, mac, payload)
         else:
             tags = {"device_id": device_id}
             if mac:
                 tags["mac_address"] = mac
 
-            # 키 맵핑(서로 다른 펌웨어/테스트 포맷 모두 수용)
-            battery        = _pick(payload, "battery", "bat_level", "bat")
-            temperature    = _pick(payload, "temperature", "amb_temp", "temp")
-            humidity       = _pick(payload, "humidity", "amb_humi", "hum")
-            light_lux      = _pick(payload, "light_lux", "amb_light", "lux")
-            soil_temp      = _pick(payload, "soil_temp")
-            soil_moisture  = _pick(payload, "soil_moisture", "soil_humi")
-            soil_ec        = _pick(payload, "soil_ec")
-
-            # 타입 캐스팅: battery는 정수, 나머지는 float
-            fields = {
-                "battery": _to_int(payload.get("battery") or payload.get("bat_level")),
-                "temperature": _to_float(payload.get("temperature") or payload.get("amb_temp")),
-                "humidity": _to_float(payload.get("humidity") or payload.get("amb_humi")),
-                "light_lux": _to_float(payload.get("light_lux") or payload.get("amb_light")),
-                "soil_temp": _to_float(payload.get("soil_temp")),
-                "soil_moisture": _to_float(payload.get("soil_moisture") or payload.get("soil_humi")),
-                "soil_ec": _to_float(payload.get("soil_ec")),
-                "comment": payload.get("comment"),
-            }
-            valid_fields = {k: v for k, v in fields.items() if v is not None}
+            # _FIELD_SPEC 한 번 순회: 허용 키 순서대로 캐스팅에 성공한 첫 값 사용
+            # (0/0.0도 유효값, ""나 숫자가 아닌 값이면 다음 키로) — 값이 있는 필드만 바로 담음
+            valid_fields = {}
+            for name, keys, cast in _FIELD_SPEC:
+                for k in keys:
+                    v = payload.get(k)
+                    if v is not None and cast is not None:
+                        v = cast(v)
+                    if v is not None:
+                        valid_fields[name] = v
+                        break
 
             if valid_fields:
                 ts_str = payload.get("_time") or payload.get("time") or payload.get("timestamp") or None
-                # InfluxDB: 디바이스 타임스탬프 우선
+                # InfluxDB: 디바이스 타임스탬프 우선 (line protocol은 호출 안에서 문자열로 만들어짐)
                 write_sensor_data_to_influxdb("sensor_readings", tags, valid_fields, ts=ts_str)
 
-                # Redis 캐시: 프론트 조회용, 동일 타입 유지
-                redis_doc = {"timestamp": ts_str or datetime.utcnow().isoformat(), **valid_fields}
-                set_redis_data(f"latest_sensor_data:{device_id}", redis_doc)
+                # Redis 캐시: 프론트 조회용, 동일 타입 유지 — 같은 dict에 timestamp만 추가해 재사용
+                valid_fields["timestamp"] = ts_str or datetime.utcnow().isoformat()
+                set_redis_data(f"latest_sensor_data:{device_id}", valid_fields)
                 print(f"Sensor data processed and stored for {device_id}")
 
     except Exception as e:
@@ -622,11 +866,13 @@ def send_mode_to_device(device_id: str,
     _publish_conf(device_id, payload)
     return payload
 
-def send_config_to_device(device_id: str, config_payload: dict):
+def send_config_to_device(device_id: str, config_payload: dict, wait: bool = False):
     """
     sends a configuration payload to a device via mqtt.
     this function is flexible and accepts both high-level keys (like 'mode')
     and low-level keys (like 'pwr_mode').
+    wait=True blocks until the broker acks the message (up to 5s);
+    by default the message is queued and paho's network loop delivers it.
     """
     if not mqtt_client.is_connected():
         connect_mqtt()
@@ -646,7 +892,8 @@ def send_config_to_device(device_id: str, config_payload: dict):
         # === publish the message with retain flag ===
 
         info = mqtt_client.publish(topic, payload_str, qos=1, retain=True)
-        info.wait_for_publish(timeout=5) # wait for the message to be sent
+        if wait:
+            info.wait_for_publish(timeout=5) # wait for the message to be sent
 
         if info.rc == 0:
             print(f"successfully sent config to topic: {topic} payload={payload_str}")
@@ -658,16 +905,17 @@ def send_config_to_device(device_id: str, config_payload: dict):
 
         
 # --- MQTT 퍼블리시(앱에서 기대하는 공개 API) ---
-def publish_mqtt_message(topic: str, payload, qos: int = 0, retain: bool = False) -> bool:
+def publish_mqtt_message(topic: str, payload, qos: int = 0, retain: bool = False, wait: bool = False) -> bool:
     """
     앱(app.py)이 import 해서 쓰는 표준 퍼블리시 함수.
     payload가 dict/list면 JSON 문자열로 변환해서 전송.
     MQTT 연결이 안 되어 있으면 자동으로 연결 시도.
+    기본은 큐에 넣고 바로 반환(paho 네트워크 루프가 전송). 전송 확인이 필요하면 wait=True.
     """
     try:
         # payload를 문자열로 정규화
         if isinstance(payload, (dict, list)):
-            payload_str = json.dumps(payload, ensure_ascii=False)
+            payload_str = _fast_json_dumps(payload)
         else:
             payload_str = str(payload)
 
@@ -676,12 +924,13 @@ def publish_mqtt_message(topic: str, payload, qos: int = 0, retain: bool = False
             connect_mqtt()
 
         info = mqtt_client.publish(topic, payload_str, qos=qos, retain=retain)
-        try:
-            # 전송 완료까지 최대 5초 대기 (성공 시 True)
-            info.wait_for_publish(timeout=5)
-        except TypeError:
-            # 일부 버전에선 timeout 파라미터가 없을 수 있음
-            info.wait_for_publish()
+        if wait:
+            try:
+                # 전송 완료까지 최대 5초 대기 (성공 시 True)
+                info.wait_for_publish(timeout=5)
+            except TypeError:
+                # 일부 버전에선 timeout 파라미터가 없을 수 있음
+                info.wait_for_publish()
 
         return getattr(info, "rc", 0) == 0
     except Exception as e:
@@ -710,17 +959,6 @@ def initialize_services():
     print("[services] ✅ InfluxDB connected (or tried)")
     connect_redis()
     print("[services] ✅ Redis connected (or tried)")
-    print("\n--- Initializing Backend Services ---")
-    for name in ("connect_mqtt", "connect_influxdb", "connect_redis"):
-        func = globals().get(name, None)
-        if callable(func):
-            try:
-                func()
-                print(f"{name} ok")
-            except Exception as e:
-                print(f"{name} failed: {e}")
-        else:
-            print(f"{name} not defined — skipping")
     print("--- All services connection attempts made. ---\n")
 
 def get_influx_client():
@@ -729,43 +967,47 @@ def get_influx_client():
 __all__ = [
     "connect_influxdb",
     "query_influxdb_data",
+    "query_influxdb_data_df",
     "write_sensor_data_to_influxdb",
     "get_influx_client",
 ]
 
-def parse_csv_result(decoded_csv: str):
+def parse_csv_result(decoded_csv):
     """
+    decoded_csv: CSV 문자열 또는 줄 단위 iterable(스트리밍 응답).
     InfluxDB CSV 응답에서 주석(#...)은 제거하고,
-    헤더 맨 앞에 빈 컬럼이 있으면 제거한 뒤 DictReader로 파싱한다.
+    헤더 맨 앞에 빈 컬럼이 있으면 제거한 뒤 행 dict로 파싱한다.
     '_time' 또는 'time' 컬럼이 있는 행만 반환.
     """
-    # 1) 줄 단위 정리: 빈 줄/주석 제거
-    raw_lines = decoded_csv.splitlines()
-    lines = [ln for ln in raw_lines if ln and not ln.startswith("#")]
-    if not lines:
+    # csv.reader 한 번으로 읽으면서 주석/빈 줄 건너뛰기 (줄 분리 → 재조합 → DictReader 재파싱 없이)
+    reader = csv.reader(StringIO(decoded_csv) if isinstance(decoded_csv, str) else decoded_csv)
+    header_cols = None
+    for row in reader:
+        if row and not row[0].startswith("#"):
+            header_cols = row
+            break
+    if header_cols is None:
         print("[DEBUG] parse_csv_result: no non-comment lines")
         return []
 
-    # 2) 헤더 파싱 & 맨 앞 빈 컬럼 제거
-    header_cols = lines[0].split(",")
-    drop_first = (len(header_cols) > 0 and header_cols[0] == "")
-    if drop_first:
-        header_cols = header_cols[1:]
-
-    # 3) 데이터 라인도 동일하게 첫 컬럼 제거
-    fixed_data_lines = []
-    for ln in lines[1:]:
-        cols = ln.split(",")
-        if drop_first and len(cols) > 0:
-            cols = cols[1:]
-        fixed_data_lines.append(",".join(cols))
-
-    # 4) DictReader로 재구성해서 읽기
-    csv_text = ",".join(header_cols) + "\n" + "\n".join(fixed_data_lines)
-    reader = csv.DictReader(StringIO(csv_text))
+    # 헤더 맨 앞 빈 컬럼(annotation 자리)은 데이터 행에서도 같이 제거
+    skip = 1 if header_cols[0] == "" else 0
+    header_cols = header_cols[skip:]
+    n_cols = len(header_cols)
 
     rows = []
-    for r in reader:
+    for row in reader:
+        if not row or row[0].startswith("#"):
+            continue
+        vals = row[skip:] if skip else row
+        r = dict(zip(header_cols, vals))
+        if len(vals) != n_cols:
+            # DictReader와 같은 규칙: 모자라면 None, 남으면 None 키에 리스트로
+            if len(vals) < n_cols:
+                for c in header_cols[len(vals):]:
+                    r[c] = None
+            else:
+                r[None] = vals[n_cols:]
         # 실제 데이터만 수집
         if r.get("_time") or r.get("time"):
             rows.append(r)
@@ -775,41 +1017,75 @@ def parse_csv_result(decoded_csv: str):
         print(f"[DEBUG] parsed_sample_keys={list(rows[0].keys())}")
     return rows
 
+def parse_csv_frame(decoded_csv: str) -> pd.DataFrame:
+    """
+    InfluxDB CSV 응답을 DataFrame으로 변환.
+    테이블(스키마)마다 빈 줄로 구분된 블록과 자체 헤더가 오므로 블록별로 읽어 합친다.
+    주석(#...)과 맨 앞 빈 컬럼은 제거하고, '_time' 컬럼이 있는 행만 남긴다.
+    블록에 #datatype 주석이 있으면 숫자형(double/long/unsignedLong) 컬럼은 float64,
+    dateTime 컬럼은 UTC datetime64로 읽고, 나머지(주석이 없는 블록 포함)는 문자열 그대로 둔다.
+    """
+    frames = []
+    for block in _RE_CSV_BLOCK_SEP.split(decoded_csv):
+        lines = block.splitlines()
+        types = next((ln.split(",") for ln in lines if ln.startswith("#datatype")), None)
+        data = [ln for ln in lines if ln and not ln.startswith("#")]
+        if not data:
+            continue
+        dtype, time_cols = object, []
+        if types:
+            # 주석 행과 헤더 행은 같은 위치에 같은 컬럼 (맨 앞은 둘 다 주석용 빈 컬럼)
+            col_types = [(col, t) for col, t in zip(data[0].split(","), types) if col]
+            dtype = {col: ("float64" if t in _FLUX_NUMERIC_TYPES else object) for col, t in col_types}
+            time_cols = [col for col, t in col_types if t.startswith("dateTime")]
+        df = pd.read_csv(StringIO("\n".join(data)), dtype=dtype)
+        if len(df.columns) and df.columns[0].startswith("Unnamed"):
+            df = df.iloc[:, 1:]
+        for col in time_cols:
+            df[col] = pd.to_datetime(df[col], utc=True, errors="coerce", format="ISO8601")
+        if "_time" not in df.columns:
+            continue
+        frames.append(df[df["_time"].notna()])
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
 # --- 한줄평 로더 (추가) ---
-_comment_cache = {}
+@functools.lru_cache(maxsize=None)
+def _load_plant_comments() -> dict:
+    """plant_comments.json을 한 번만 읽어 캐시 (실패/빈 파일이어도 다시 읽지 않음)"""
+    try:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        comment_file_path = os.path.join(current_dir, 'plant_comments.json')
+        with open(comment_file_path, 'rb') as f:
+            comments = _fast_json_loads(f.read())
+        print("[INFO] Plant comments loaded successfully.")
+        return comments
+    except Exception as e:
+        print(f"[ERROR] Failed to load plant_comments.json: {e}")
+        return {
+            "_default": "분석 결과를 확인해주세요.",
+            "_error": "분석 중 오류가 발생했습니다."
+        }
 
 def get_plant_comment(primary_key: str = None, fallback_key: str = None) -> str:
     """
     AI가 예측한 레이블을 기반으로 사용자 친화적인 한줄평을 반환합니다.
-    JSON 파일을 읽고 그 내용을 캐시에 저장하여 성능을 최적화합니다.
+    JSON 파일은 처음 호출될 때 한 번만 읽어 캐시합니다.
     """
-    global _comment_cache
-
-    if not _comment_cache:
-        try:
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            comment_file_path = os.path.join(current_dir, 'plant_comments.json')
-            with open(comment_file_path, 'r', encoding='utf-8') as f:
-                _comment_cache = json.load(f)
-            print("[INFO] Plant comments loaded successfully.")
-        except Exception as e:
-            print(f"[ERROR] Failed to load plant_comments.json: {e}")
-            _comment_cache = {
-                "_default": "분석 결과를 확인해주세요.",
-                "_error": "분석 중 오류가 발생했습니다."
-            }
+    comments = _load_plant_comments()
 
     # 1. 주요 키 (e.g., "Rose_healthy")로 먼저 검색
     if primary_key:
-        comment = _comment_cache.get(primary_key)
+        comment = comments.get(primary_key)
         if comment:
             return comment
 
     # 2. 주요 키가 없을 경우, 대체 키 (e.g., "healthy")로 검색
     if fallback_key:
-        comment = _comment_cache.get(fallback_key)
+        comment = comments.get(fallback_key)
         if comment:
             return comment
 
     # 3. 두 키 모두 없을 경우, 기본 메시지 반환
-    return _comment_cache.get("_default", "분석 결과를 확인해주세요.")
\ No newline at end of file
+    return comments.get("_default", "분석 결과를 확인해주세요.")
\ No newline at end of file
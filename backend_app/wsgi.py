@@ -30,4 +30,8 @@ if init_runtime_and_scheduler:
 # gunicorn이 import하여 app을 노출
 # 로컬 실행용 진입점도 유지
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    try:
+        app.run(host="0.0.0.0", port=5000)
+    finally:
+        from backend_app.services import shutdown_services
+        shutdown_services()  # Influx 배치 버퍼 flush (인터프리터 종료 전)
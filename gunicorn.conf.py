@@ -0,0 +1,10 @@
+# gunicorn 설정 — 실행 옵션은 Dockerfile CMD 인자를 그대로 쓰고, 여기서는 종료 훅만 정의
+# (gunicorn은 작업 디렉토리의 gunicorn.conf.py를 자동으로 읽음)
+
+def worker_exit(server, worker):
+    """워커 프로세스 종료 직전(인터프리터 종료 전)에 호출: Influx 배치 버퍼 flush"""
+    try:
+        from backend_app.services import shutdown_services
+        shutdown_services()
+    except Exception as e:
+        print(f"[WARN] shutdown_services failed: {e}")